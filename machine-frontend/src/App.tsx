@@ -1,4 +1,4 @@
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import { BrowserRouter as Router, Routes, Route, Link } from 'react-router-dom';
 import ControlPanel from './components/ControlPanel';
 import LaborPage from './components/LaborPage';
@@ -51,6 +51,11 @@ function App() {
   const [systemData, setSystemData] = useState<SystemData | null>(null);
   const [backendData, setBackendData] = useState<BackendData | null>(null);
   const [error, setError] = useState<string | null>(null);
+  // Last state version received; the backend only sends variables changed since then
+  const stateVersion = useRef(0);
+  // Epoch of the backend process those versions belong to
+  const stateEpoch = useRef<string | null>(null);
+  const latestData = useRef<BackendData>({});
   
   // Function to update a backend variable
   const updateBackendVariable = async (key: string, value: any) => {
@@ -84,13 +89,34 @@ function App() {
   // Fetch data from the backend API
   const fetchBackendData = async () => {
     try {
-      const response = await fetch('http://localhost:5000/api/status');
+      const since = stateVersion.current;
+      const response = await fetch(`http://localhost:5000/api/status?since=${since}`);
       
       if (!response.ok) {
         throw new Error(`API request failed: ${response.statusText}`);
       }
       
-      const data = await response.json();
+      const delta = await response.json();
+      // A new epoch means the backend restarted and its versions started over:
+      // drop everything held and fetch the full state again
+      if (delta.epoch !== stateEpoch.current) {
+        const restarted = stateEpoch.current !== null;
+        stateEpoch.current = delta.epoch;
+        if (restarted && since !== 0) {
+          stateVersion.current = 0;
+          latestData.current = {};
+          fetchBackendData();
+          return;
+        }
+      }
+      // Ignore responses that were overtaken by a newer one while in flight
+      if (stateVersion.current !== since && delta.version < stateVersion.current) {
+        return;
+      }
+      const base = since === 0 ? {} : latestData.current;
+      const data: BackendData = { ...base, ...delta.changes };
+      latestData.current = data;
+      stateVersion.current = delta.version;
       
       // Only update if data has actually changed
       setBackendData(prevData => {
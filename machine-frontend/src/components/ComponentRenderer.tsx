@@ -189,6 +189,7 @@ const ComponentRenderer: React.FC<ComponentRendererProps> = ({
           <Plotter
             label={visualization.label || ''}
             value={machineState[`${id}.${visualization.source_key}`] as number || 0}
+            historyKey={`${id}.${visualization.source_key}`}
             width={visualization.width || 200}
             height={visualization.height || 100}
           />
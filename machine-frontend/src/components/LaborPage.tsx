@@ -1,4 +1,4 @@
-import React, { useEffect, useState } from 'react';
+import React, { useEffect, useRef, useState } from 'react';
 import ComponentRenderer from './ComponentRenderer';
 import './LaborPage.css';
 import type { Component, MachineVariables } from '../types/MachineTypes';
@@ -16,6 +16,10 @@ function LaborPage() {
   const [backendData, setBackendData] = useState<MachineVariables>({});
   const [error, setError] = useState<string | null>(null);
   const [components, setComponents] = useState<Component[]>([]);
+  // Last state version received; the backend only sends variables changed since then
+  const stateVersion = useRef(0);
+  // Epoch of the backend process those versions belong to
+  const stateEpoch = useRef<string | null>(null);
   
   // Function to update a backend variable
   const updateBackendVariable = async (key: string, value: any) => {
@@ -49,14 +53,36 @@ function LaborPage() {
   // Fetch data from the backend API
   const fetchBackendData = async () => {
     try {
-      const response = await fetch('http://localhost:5000/api/status');
+      const since = stateVersion.current;
+      const response = await fetch(`http://localhost:5000/api/status?since=${since}`);
       
       if (!response.ok) {
         throw new Error(`API request failed: ${response.statusText}`);
       }
       
-      const data = await response.json();
-      setBackendData(data);
+      const delta = await response.json();
+      // A new epoch means the backend restarted and its versions started over:
+      // drop everything held and fetch the full state again
+      if (delta.epoch !== stateEpoch.current) {
+        const restarted = stateEpoch.current !== null;
+        stateEpoch.current = delta.epoch;
+        if (restarted && since !== 0) {
+          stateVersion.current = 0;
+          setBackendData({});
+          fetchBackendData();
+          return;
+        }
+      }
+      // Ignore responses that were overtaken by a newer one while in flight
+      if (stateVersion.current !== since && delta.version < stateVersion.current) {
+        return;
+      }
+      stateVersion.current = delta.version;
+      if (since === 0) {
+        setBackendData({ ...delta.changes });
+      } else {
+        setBackendData(prevData => ({ ...prevData, ...delta.changes }));
+      }
       setError(null);
     } catch (err) {
       console.error('Error fetching data:', err);
@@ -5,6 +5,7 @@ interface PlotterProps {
   label?: string;
   width?: number;
   height?: number;
+  historyKey?: string; // Variable whose server-side history seeds the plot
 }
 
 interface DataPoint {
@@ -38,12 +39,33 @@ const Plotter: React.FC<PlotterProps> = ({
   label = 'Production',
   width = 300,
   height = 150,
+  historyKey,
 }) => {
   // Initialize with mock data for demonstration
   const [dataPoints, setDataPoints] = useState<DataPoint[]>(createMockHistory(value));
   const previousValueRef = useRef<number>(value);
   const lastUpdateTimeRef = useRef<number>(Date.now());
   
+  // Replace the mock history with the simulator's recorded history, so a fresh tab starts full
+  useEffect(() => {
+    if (!historyKey) return;
+    const from = (Date.now() - 10 * 60 * 1000) / 1000;
+    fetch(`http://localhost:5000/api/history?keys=${encodeURIComponent(historyKey)}&from=${from}&resolution=raw`)
+      .then(response => response.ok ? response.json() : null)
+      .then(history => {
+        if (!history) return;
+        const values: number[] = history.series[historyKey] || [];
+        const recorded: DataPoint[] = history.timestamps.map((timestamp: number, i: number) => ({
+          timestamp: timestamp * 1000,
+          value: values[i],
+        }));
+        if (recorded.length === 0) return;
+        const lastRecorded = recorded[recorded.length - 1].timestamp;
+        setDataPoints(prevPoints => [...recorded, ...prevPoints.filter(point => point.timestamp > lastRecorded)]);
+      })
+      .catch(error => console.error('Error fetching history:', error));
+  }, [historyKey]);
+
   // Update data points when value changes
   useEffect(() => {
     const now = Date.now();
@@ -61,6 +61,7 @@ const ProductCounterDisplay: React.FC<ProductCounterDisplayProps> = ({
             width={width ? width - 40 : 260} 
             height={100} 
             label="Production Output"
+            historyKey="producer.output"
           />
         </div>
       </div>
@@ -0,0 +1,322 @@
+"""Asyncio/ASGI serving mode of the machine simulator API.
+
+    pip install uvicorn
+    uvicorn machine_asgi:app --host 0.0.0.0 --port 5000
+
+The simulator ticks from a task on the event loop (each tick runs on a thread of
+its own, so it never blocks the loop), and /api/status, /api/stream,
+/api/structure and /api/update are served by non-blocking handlers, so open
+polling or streaming connections cost no thread each. Every other route (and
+anything the fast handlers do not understand) is passed to the Flask app in a
+worker thread, so the /api/* contract is the same as with machine_simulator.py.
+"""
+import asyncio
+import io
+import json
+import os
+import sys
+import time
+from urllib.parse import parse_qs
+from machine_simulator import app as flask_app, simulator, fleet, request_seconds, response_bytes
+from machine_snapshot import encode_json
+from machine_encoding import encode_status
+
+KEEPALIVE_SECONDS = 15
+UPDATE_TIMEOUT = 1.0
+
+
+def _header(scope, name):
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def _etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == "*" or tag.strip('"') == etag:
+            return True
+    return False
+
+
+class MachineASGI:
+    def __init__(self, simulator, wsgi_app):
+        self.simulator = simulator
+        self.wsgi_app = wsgi_app
+        self._tick = asyncio.Event() # Set after every tick, then replaced by a fresh one
+        self._task = None
+        self._loop = None
+        self.routes = {
+            ("GET", "/api/status"): self.status,
+            ("GET", "/api/stream"): self.stream,
+            ("GET", "/api/structure"): self.structure,
+            ("POST", "/api/update"): self.update,
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+        start_time = time.perf_counter()
+        handler = self.routes.get((scope["method"], scope["path"]), self.wsgi)
+        result = await handler(scope, receive, send)
+        # Requests answered by Flask (result None) are recorded by Flask itself
+        if result is not None:
+            status, size = result
+            labels = (("endpoint", scope["path"]), ("method", scope["method"]))
+            request_seconds.observe(time.perf_counter() - start_time, labels)
+            if size is not None:
+                response_bytes.observe(size, labels)
+
+    # --- Simulation task ---
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                self.start()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.stop()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def start(self):
+        if os.environ.get('MACHINE_TICK_LOG'):
+            self.simulator.enable_tick_log(os.environ['MACHINE_TICK_LOG'])
+        self.simulator.running = True
+        self._loop = asyncio.get_running_loop()
+        self._task = self._loop.create_task(self.simulator.scheduler.run_async(self._run_tick))
+        fleet.start_simulation()
+        print("Machine simulation task started.")
+
+    def stop(self):
+        self.simulator.stop_simulation()
+        fleet.stop_simulation()
+
+    def _run_tick(self, subsystems):
+        # Runs on the scheduler's tick thread; waiters are woken on the loop
+        self.simulator.update_components(subsystems)
+        self._loop.call_soon_threadsafe(self._notify_tick)
+
+    def _notify_tick(self):
+        tick, self._tick = self._tick, asyncio.Event()
+        tick.set()
+
+    async def wait_for_tick(self, timeout):
+        """Wait for the next tick; returns False on timeout."""
+        try:
+            await asyncio.wait_for(self._tick.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    # --- Responses ---
+
+    async def respond(self, send, status, body, content_type="application/json", headers=()):
+        response_headers = [(b"access-control-allow-origin", b"*")]
+        if body or status != 304:
+            response_headers.append((b"content-type", content_type.encode()))
+            response_headers.append((b"content-length", str(len(body)).encode()))
+        response_headers.extend(headers)
+        await send({"type": "http.response.start", "status": status, "headers": response_headers})
+        await send({"type": "http.response.body", "body": body})
+        return status, len(body)
+
+    async def respond_json(self, send, status, data):
+        return await self.respond(send, status, encode_json(data))
+
+    async def read_body(self, receive):
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                break
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body"):
+                break
+        return b"".join(chunks)
+
+    # --- Routes ---
+
+    async def status(self, scope, receive, send):
+        # Served from the published snapshot, without taking the simulator lock
+        query = parse_qs(scope["query_string"].decode("latin-1"), keep_blank_values=True)
+        try:
+            encoded = encode_status(self.simulator.snapshot, {name: values[0] for name, values in query.items()},
+                                    _header(scope, b"accept") or "", _header(scope, b"accept-encoding") or "")
+        except ValueError as e:
+            return await self.respond_json(send, 400, {"error": str(e)})
+        headers = [(name.lower().encode(), value.encode()) for name, value in encoded.headers()]
+        if encoded.etag is None:
+            return await self.respond(send, 200, encoded.body, encoded.content_type, headers)
+
+        headers += [(b"etag", f'"{encoded.etag}"'.encode()), (b"cache-control", b"no-cache")]
+        if _etag_matches(_header(scope, b"if-none-match"), encoded.etag):
+            return await self.respond(send, 304, b"", headers=headers)
+        return await self.respond(send, 200, encoded.body, encoded.content_type, headers)
+
+    async def structure(self, scope, receive, send):
+        # A changed file is reloaded under the simulator lock, which must not be waited for on the loop
+        await asyncio.get_running_loop().run_in_executor(None, self.simulator.check_structures)
+        etag = self.simulator.structure_etag
+        headers = [(b"etag", f'"{etag}"'.encode()), (b"cache-control", b"no-cache")]
+        if _etag_matches(_header(scope, b"if-none-match"), etag):
+            return await self.respond(send, 304, b"", headers=headers)
+        return await self.respond(send, 200, self.simulator.structure_body, headers=headers)
+
+    async def update(self, scope, receive, send):
+        content_type = _header(scope, b"content-type") or ""
+        if not content_type.startswith("application/json"):
+            # Let Flask answer requests it would reject in its own way
+            return await self.wsgi(scope, receive, send)
+        try:
+            data = json.loads(await self.read_body(receive))
+        except ValueError:
+            data = None
+        if not data or not isinstance(data, dict):
+            return await self.respond_json(send, 400, {"error": "Invalid JSON"})
+
+        if data.get('system.debug'):
+            def debug():
+                self.simulator.print_status()
+                return self.simulator.status_dict()
+
+            # Both take the simulator lock
+            variables = await asyncio.get_running_loop().run_in_executor(None, debug)
+            return await self.respond_json(send, 200, {
+                "message": "Debug information",
+                "debug": True,
+                "variables": variables,
+            })
+
+        # All keys of the request are applied together at the next tick. Without a
+        # running loop they are applied right away, under the lock, so off the loop.
+        if self.simulator.running:
+            batch, rejected = self.simulator.queue_updates(data)
+        else:
+            batch, rejected = await asyncio.get_running_loop().run_in_executor(
+                None, self.simulator.queue_updates, data)
+        if batch is None:
+            return await self.respond_json(send, 400, {"error": "No valid variables found to update or values unchanged"})
+        deadline = time.perf_counter() + UPDATE_TIMEOUT
+        while not batch.applied.is_set():
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0 or not await self.wait_for_tick(remaining):
+                break
+        updated_keys = [key for key in data if key in batch.values]
+        if batch.version is None:
+            return await self.respond_json(send, 202, {"message": "Variables queued", "updated_keys": updated_keys})
+        return await self.respond_json(send, 200, {
+            "message": "Variables updated",
+            "updated_keys": updated_keys,
+            "version": batch.version,
+            "new_values": self.simulator.snapshot.variables,
+        })
+
+    async def stream(self, scope, receive, send):
+        """Server-Sent Events stream with one event of changed variables per new version"""
+        query = parse_qs(scope["query_string"].decode("latin-1"), keep_blank_values=True)
+        try:
+            since = int(query["since"][0] if "since" in query else _header(scope, b"last-event-id") or 0)
+        except ValueError:
+            return await self.respond_json(send, 400, {"error": "since must be an integer version"})
+        if since > self.simulator.version:
+            since = 0
+
+        await send({"type": "http.response.start", "status": 200, "headers": [
+            (b"content-type", b"text/event-stream; charset=utf-8"),
+            (b"cache-control", b"no-cache"),
+            (b"access-control-allow-origin", b"*"),
+        ]})
+        disconnected = asyncio.ensure_future(self._wait_for_disconnect(receive))
+        try:
+            while not disconnected.done():
+                version, changes = self.simulator.changes_since(since)
+                if version != since:
+                    event = f"id: {version}\ndata: {json.dumps({'epoch': self.simulator.epoch, 'version': version, 'changes': changes})}\n\n"
+                    await send({"type": "http.response.body", "body": event.encode(), "more_body": True})
+                    since = version
+                tick = asyncio.ensure_future(self._tick.wait())
+                done, _ = await asyncio.wait({tick, disconnected}, timeout=KEEPALIVE_SECONDS,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                tick.cancel()
+                if not done:
+                    await send({"type": "http.response.body", "body": b": keepalive\n\n", "more_body": True})
+        finally:
+            disconnected.cancel()
+        return 200, None
+
+    async def _wait_for_disconnect(self, receive):
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+    # --- Everything else goes to Flask ---
+
+    async def wsgi(self, scope, receive, send):
+        body = await self.read_body(receive)
+        environ = self._environ(scope, body)
+        status, headers, chunks = await asyncio.get_running_loop().run_in_executor(None, self._call_wsgi, environ)
+        await send({"type": "http.response.start", "status": status,
+                    "headers": [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers]})
+        await send({"type": "http.response.body", "body": chunks})
+
+    def _environ(self, scope, body):
+        server = scope.get("server") or ("localhost", 80)
+        environ = {
+            "REQUEST_METHOD": scope["method"],
+            "SCRIPT_NAME": scope.get("root_path", ""),
+            "PATH_INFO": scope["path"],
+            "QUERY_STRING": scope["query_string"].decode("latin-1"),
+            "SERVER_NAME": str(server[0]),
+            "SERVER_PORT": str(server[1]),
+            "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+            "CONTENT_LENGTH": str(len(body)),
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": scope.get("scheme", "http"),
+            "wsgi.input": io.BytesIO(body),
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False,
+        }
+        for name, value in scope["headers"]:
+            name = name.decode("latin-1").upper().replace("-", "_")
+            value = value.decode("latin-1")
+            if name == "CONTENT_LENGTH":
+                continue
+            key = name if name == "CONTENT_TYPE" else f"HTTP_{name}"
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+        return environ
+
+    def _call_wsgi(self, environ):
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response["status"] = int(status.split(" ", 1)[0])
+            response["headers"] = headers
+
+        result = self.wsgi_app(environ, start_response)
+        try:
+            body = b"".join(result)
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+        return response["status"], response["headers"], body
+
+
+app = MachineASGI(simulator, flask_app)
+
+if __name__ == "__main__":
+    try:
+        import uvicorn
+    except ImportError:
+        sys.exit("The ASGI mode needs an ASGI server: pip install uvicorn")
+    uvicorn.run(app, host="0.0.0.0", port=5000)
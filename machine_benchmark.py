@@ -0,0 +1,142 @@
+"""Microbenchmarks of the simulator core and the Flask routes.
+
+Results are written as JSON so later runs can be compared against a baseline:
+
+    python machine_benchmark.py --output baseline.json
+    python machine_benchmark.py --compare baseline.json
+
+With --compare the exit status is 1 if any benchmark got slower than the
+baseline by more than --threshold.
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+import numpy as np
+from machine_engine import StepEngine
+from machine_snapshot import encode_json
+
+PLANT_SIZES = (3, 30, 300) # generators (and as many akkus and chemical tanks) per plant
+
+
+def measure(function, number=1000, repeat=5):
+    """Run `function` `number` times per round; returns per-call microseconds of the rounds."""
+    function() # warm up
+    rounds = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        for _ in range(number):
+            function()
+        rounds.append((time.perf_counter() - start_time) / number * 1e6)
+    return {"median_us": statistics.median(rounds), "min_us": min(rounds), "calls": number * repeat}
+
+
+def plant_components(units):
+    """Component list of a synthetic plant with `units` generators, akkus and chemical tanks.
+
+    It has no connections, so the engine's fallback wiring is used: generator n
+    charges akku n, and every akku and tank feeds the single aggregator and mixer.
+    """
+    components = [{"id": "mixer", "type": "mixer"}, {"id": "aggregator", "type": "aggregator"},
+                  {"id": "producer", "type": "producer"}, {"id": "productCounter", "type": "counter"},
+                  {"id": "room", "type": "environment"}]
+    for i in range(1, units + 1):
+        components.append({"id": f"chemical{i}", "type": "chemical"})
+        components.append({"id": f"generator{i}", "type": "generator"})
+        components.append({"id": f"akku{i}", "type": "battery"})
+    return components
+
+
+def engine_benchmarks(number):
+    results = {}
+    for units in PLANT_SIZES:
+        engine = StepEngine(plant_components(units), rng=np.random.default_rng(0))
+        results[f"engine_step[{units}]"] = measure(engine.step, number)
+    return results
+
+
+def simulator_benchmarks(number):
+    from machine_simulator import MachineSimulator
+    simulator = MachineSimulator(seed=0)
+    # Nothing else ticks, so updates are applied as soon as they are submitted
+    updates = iter(range(10 ** 9))
+    return {
+        "update_components": measure(simulator.update_components, number),
+        "status_dict": measure(simulator.status_dict, number),
+        "encode_json": measure(lambda: encode_json(simulator.snapshot.variables), number),
+        "publish_snapshot": measure(simulator._publish_snapshot, number),
+        "changes_since": measure(lambda: simulator.changes_since(simulator.version - 1), number),
+        "prepare_updates": measure(lambda: simulator.prepare_updates({"power-slider.value": "50"}), number),
+        "update_variable": measure(lambda: simulator.update_variable("power-slider.value", next(updates) % 100), number),
+    }
+
+
+def route_benchmarks(number):
+    import machine_simulator
+    client = machine_simulator.app.test_client()
+    etag = machine_simulator.simulator.snapshot.etag
+    return {
+        "GET /api/status": measure(lambda: client.get('/api/status'), number),
+        "GET /api/status (304)": measure(lambda: client.get('/api/status', headers={"If-None-Match": f'"{etag}"'}), number),
+        "GET /api/status?since": measure(lambda: client.get('/api/status?since=1'), number),
+        "POST /api/update": measure(lambda: client.post('/api/update', json={"flow-slider.value": 40}), number),
+    }
+
+
+def compare(results, baseline, threshold):
+    """Print the change against `baseline`; returns the names that regressed beyond `threshold`."""
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            print(f"{name:32s} {result['min_us']:10.1f} us   (new)")
+            continue
+        # The fastest round is the least disturbed by other load on the machine
+        ratio = result["min_us"] / before["min_us"]
+        flag = ""
+        if ratio > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:32s} {result['min_us']:10.1f} us   {ratio:5.2f}x baseline{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the machine simulator")
+    parser.add_argument("--number", type=int, default=1000, help="calls per timing round")
+    parser.add_argument("--output", default=None, help="write results as JSON to this file")
+    parser.add_argument("--compare", default=None, help="baseline JSON file to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25, help="slowdown ratio counted as regression")
+    args = parser.parse_args()
+
+    results = {}
+    results.update(engine_benchmarks(args.number))
+    results.update(simulator_benchmarks(args.number))
+    results.update(route_benchmarks(args.number))
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote results to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+    else:
+        for name, result in results.items():
+            print(f"{name:32s} {result['min_us']:10.1f} us (median {result['median_us']:.1f})")
+
+
+if __name__ == "__main__":
+    main()
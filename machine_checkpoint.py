@@ -0,0 +1,62 @@
+import json
+import struct
+import numpy as np
+
+MAGIC = b"MCKP"
+FORMAT_VERSION = 1
+# magic, format version, metadata length, state length
+_HEADER = struct.Struct("<4sHII")
+
+
+class Checkpoint:
+    """Complete simulator state at one moment: variables, cycle count, RNG state and structure.
+
+    Holding a Checkpoint in memory costs one copy of the state row; to_bytes()
+    gives a compact binary form (a JSON metadata block followed by the raw
+    little-endian float64 state row) that from_bytes() reads back.
+    """
+
+    __slots__ = ("state", "extras", "cycle_count", "rng_state", "structures")
+
+    def __init__(self, state, extras, cycle_count, rng_state, structures):
+        self.state = state
+        self.extras = extras
+        self.cycle_count = cycle_count
+        self.rng_state = rng_state
+        self.structures = structures
+
+    def to_bytes(self):
+        meta = json.dumps({
+            "cycle_count": self.cycle_count,
+            "extras": self.extras,
+            "rng_state": self.rng_state,
+            "structures": self.structures,
+        }, separators=(',', ':')).encode()
+        state = self.state.astype('<f8', copy=False).tobytes()
+        return _HEADER.pack(MAGIC, FORMAT_VERSION, len(meta), len(state)) + meta + state
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Read a checkpoint written by to_bytes(); raises ValueError for anything else."""
+        if len(data) < _HEADER.size:
+            raise ValueError("Not a machine checkpoint")
+        magic, version, meta_length, state_length = _HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError("Not a machine checkpoint")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported checkpoint format {version}")
+        if len(data) != _HEADER.size + meta_length + state_length or state_length % 8:
+            raise ValueError("Truncated checkpoint")
+        meta = json.loads(data[_HEADER.size:_HEADER.size + meta_length])
+        if not isinstance(meta, dict) or not isinstance(meta.get("extras"), dict) \
+                or not isinstance(meta.get("cycle_count"), int) or not isinstance(meta.get("rng_state"), dict) \
+                or not isinstance(meta.get("structures"), list) or len(meta["structures"]) != 2:
+            raise ValueError("Malformed checkpoint metadata")
+        for structure in meta["structures"]:
+            if not isinstance(structure, dict) or not isinstance(structure.get("components"), list) \
+                    or not isinstance(structure.get("connections", []), list) \
+                    or not all(isinstance(component, dict) for component in structure["components"]):
+                raise ValueError("Malformed checkpoint structure")
+        state = np.frombuffer(data, dtype='<f8', count=state_length // 8,
+                              offset=_HEADER.size + meta_length).astype(np.float64)
+        return cls(state, meta["extras"], meta["cycle_count"], meta["rng_state"], meta["structures"])
@@ -0,0 +1,44 @@
+import threading
+from collections import deque
+
+
+class UpdateBatch:
+    """Coerced variable writes of one API request, applied together at a tick boundary."""
+
+    def __init__(self, values):
+        self.values = values
+        self.version = None # State version the batch became visible in
+        self.applied = threading.Event()
+
+    def wait(self, timeout=None):
+        return self.applied.wait(timeout)
+
+
+class CommandQueue:
+    """Queue of UpdateBatches filled by API threads and drained once per tick.
+
+    `submit` is a plain deque append, so request threads never wait for the
+    simulation lock. Draining coalesces all pending batches into one dict in
+    submission order, so the last write to a key wins.
+    """
+
+    def __init__(self):
+        self._batches = deque()
+
+    def __len__(self):
+        return len(self._batches)
+
+    def submit(self, values):
+        batch = UpdateBatch(values)
+        self._batches.append(batch)
+        return batch
+
+    def drain(self):
+        """Remove all pending batches; returns (batches, coalesced values)."""
+        batches = []
+        values = {}
+        while self._batches:
+            batch = self._batches.popleft()
+            batches.append(batch)
+            values.update(batch.values)
+        return batches, values
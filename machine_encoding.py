@@ -0,0 +1,188 @@
+"""Field selection and compact encodings of /api/status responses.
+
+    ?keys=generator*,akku1.*,room.temp  only these variables; a trailing "*" matches a prefix
+    ?format=array                        the values alone, in the order GET /api/schema lists
+                                         for the same ?keys, tagged with its schema id
+    Accept: application/msgpack         MessagePack instead of JSON (needs the msgpack package)
+    Accept-Encoding: br, gzip            compressed body (br needs the brotli package)
+
+Full-state responses are encoded once per version and variant and shared by
+every client asking for the same thing.
+"""
+import gzip
+import hashlib
+from bisect import bisect_left
+from machine_snapshot import encode_json
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack")
+# Smaller bodies are sent as they are; compressing them saves next to nothing
+MIN_COMPRESS_SIZE = 512
+# Bounds the per-index selector cache and the per-snapshot body cache
+MAX_CACHED = 256
+
+
+class KeyIndex:
+    """Variable names in schema order, with a sorted copy for prefix lookups.
+
+    The schema id is a hash of the names in order, so it changes whenever a
+    positional (?format=array) response would change its layout.
+    """
+
+    def __init__(self, keys):
+        self.keys = list(keys)
+        self.schema = hashlib.sha1("\n".join(self.keys).encode()).hexdigest()[:12]
+        self._positions = {key: i for i, key in enumerate(self.keys)}
+        self._sorted = sorted(self.keys)
+        self._selections = {}
+
+    def select(self, selectors):
+        """Keys matched by a comma separated selector string, in schema order, as (list, set).
+
+        Names that are not variables match nothing, so a panel keeps working when
+        the structure loses a unit.
+        """
+        selection = self._selections.get(selectors)
+        if selection is not None:
+            return selection
+        positions = set()
+        for selector in selectors.split(","):
+            selector = selector.strip()
+            if selector.endswith("*"):
+                prefix = selector[:-1]
+                i = bisect_left(self._sorted, prefix)
+                while i < len(self._sorted) and self._sorted[i].startswith(prefix):
+                    positions.add(self._positions[self._sorted[i]])
+                    i += 1
+            elif selector in self._positions:
+                positions.add(self._positions[selector])
+        keys = [self.keys[i] for i in sorted(positions)]
+        selection = (keys, frozenset(keys))
+        if len(self._selections) >= MAX_CACHED:
+            self._selections.clear()
+        self._selections[selectors] = selection
+        return selection
+
+
+def _quality(header, token):
+    """The q value `header` (an Accept or Accept-Encoding value) gives `token`; 0 if not listed."""
+    for part in (header or "").split(","):
+        name, *params = part.split(";")
+        if name.strip().lower() != token:
+            continue
+        for param in params:
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    return float(value)
+                except ValueError:
+                    return 0.0
+        return 1.0
+    return 0.0
+
+
+def wants_msgpack(accept):
+    return msgpack is not None and any(_quality(accept, media_type) > 0 for media_type in MSGPACK_TYPES)
+
+
+def content_encoding(accept_encoding, size):
+    """Compression to use for a body of `size` bytes: "br", "gzip" or None."""
+    if size < MIN_COMPRESS_SIZE:
+        return None
+    if brotli is not None and _quality(accept_encoding, "br") > 0:
+        return "br"
+    if _quality(accept_encoding, "gzip") > 0:
+        return "gzip"
+    return None
+
+
+def compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    if encoding == "gzip":
+        # mtime=0 keeps the bytes (and so the ETag) the same for the same body
+        return gzip.compress(body, compresslevel=5, mtime=0)
+    return body
+
+
+class EncodedStatus:
+    """One /api/status response body with the headers that describe it."""
+
+    __slots__ = ("body", "content_type", "content_encoding", "etag")
+
+    def __init__(self, body, content_type, content_encoding=None, etag=None):
+        self.body = body
+        self.content_type = content_type
+        self.content_encoding = content_encoding
+        self.etag = etag
+
+    def headers(self):
+        headers = [("Vary", "Accept, Accept-Encoding")]
+        if self.content_encoding:
+            headers.append(("Content-Encoding", self.content_encoding))
+        return headers
+
+
+def _encode(data, use_msgpack):
+    if use_msgpack:
+        return msgpack.packb(data), "application/msgpack"
+    return encode_json(data), "application/json"
+
+
+def encode_status(snapshot, args, accept="", accept_encoding=""):
+    """Build the /api/status response for query `args` (single values) and the request's Accept headers.
+
+    Raises ValueError if ?since is not an integer.
+    """
+    selectors = args.get("keys")
+    positional = args.get("format") == "array"
+    use_msgpack = wants_msgpack(accept)
+
+    if "since" in args:
+        try:
+            since = int(args["since"])
+        except ValueError:
+            raise ValueError("since must be an integer version")
+        version, changes = snapshot.changes_since(since)
+        if selectors:
+            selected = snapshot.index.select(selectors)[1]
+            changes = {key: value for key, value in changes.items() if key in selected}
+        body, content_type = _encode({"epoch": snapshot.epoch, "version": version, "changes": changes},
+                                     use_msgpack)
+        encoding = content_encoding(accept_encoding, len(body))
+        return EncodedStatus(compress(body, encoding), content_type, encoding)
+
+    variant = (selectors, positional, use_msgpack, content_encoding(accept_encoding, MIN_COMPRESS_SIZE))
+    encoded = snapshot.encoded.get(variant)
+    if encoded is not None:
+        return encoded
+
+    if not selectors and not positional and not use_msgpack:
+        body, content_type = snapshot.body, "application/json"
+    else:
+        variables = snapshot.variables
+        keys = snapshot.index.select(selectors)[0] if selectors else snapshot.index.keys
+        if positional:
+            data = {"schema": snapshot.index.schema, "version": snapshot.version,
+                    "values": [variables[key] for key in keys]}
+        elif selectors:
+            data = {key: variables[key] for key in keys}
+        else:
+            data = variables
+        body, content_type = _encode(data, use_msgpack)
+    encoding = content_encoding(accept_encoding, len(body))
+    # Different bytes at the same URL need different ETags
+    etag = snapshot.etag + ("-m" if use_msgpack else "") + (f"-{encoding}" if encoding else "")
+    encoded = EncodedStatus(compress(body, encoding), content_type, encoding, etag)
+    if len(snapshot.encoded) < MAX_CACHED:
+        snapshot.encoded[variant] = encoded
+    return encoded
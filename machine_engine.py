@@ -0,0 +1,474 @@
+import copy
+import math
+import numpy as np
+from collections.abc import MutableMapping
+from typing import Dict, Any
+
+# Fields simulated for each component type and the Python type they are reported as.
+# Every unit of a type gets all of these fields, whatever its "properties" list says,
+# because the step rules below rely on them.
+COMPONENT_FIELDS = {
+    "chemical": {"value": float, "purity": float, "active": bool, "output": int},
+    "mixer": {"active": bool, "max_throughput": int, "mixture_quality": float},
+    "generator": {"value": int, "temp": float, "active": bool},
+    "battery": {"capacity": int, "value": int, "active": bool},
+    "aggregator": {"value": int, "active": bool},
+    "producer": {"consumption": int, "output": int, "active": bool},
+    "counter": {"value": int},
+    "environment": {"temp": float},
+}
+
+# Start values for units that are not listed in the simulator's initial variables,
+# so a new tank or generator only needs an entry in the JSON structure
+TYPE_DEFAULTS = {
+    "chemical": {"value": 50, "purity": 90, "active": True, "output": 50},
+    "mixer": {"active": True, "max_throughput": 200, "mixture_quality": 0},
+    "generator": {"value": 5, "temp": 20.0, "active": True},
+    "battery": {"capacity": 10000, "value": 0, "active": True},
+    "aggregator": {"value": 0, "active": True},
+    "producer": {"consumption": 20, "output": 0, "active": True},
+    "counter": {"value": 0},
+    "environment": {"temp": 20.0},
+}
+
+# Component types that carry no state at all (handled elsewhere, e.g. system.debug)
+IGNORED_TYPES = {"system"}
+
+
+def _cast_int(value):
+    return int(round(value))
+
+
+_CASTERS = {bool: bool, int: _cast_int, float: float}
+
+
+def _parse_bool(value):
+    return str(value).lower() in ['true', '1', 'yes']
+
+
+# Conversions of API values (often strings) to each kind
+_PARSERS = {bool: _parse_bool, int: int, float: float}
+
+
+def property_limits(components):
+    """(min, max, step) of every "<id>.<key>" whose entry in "properties" declares any of them."""
+    limits = {}
+    for component in components:
+        for prop in component.get("properties", []):
+            low, high, step = prop.get("min"), prop.get("max"), prop.get("step")
+            if low is None and high is None and step is None:
+                continue
+            limits[f"{component['id']}.{prop['key']}"] = (low, high, step)
+    return limits
+
+
+def _make_coercer(kind, limits=None):
+    """Build the conversion of API values for one key, with its range and step folded in."""
+    parse = _PARSERS[kind]
+    if limits is None or kind is bool:
+        return parse
+    low, high, step = limits
+    cast = _CASTERS[kind]
+    low = -math.inf if low is None else low
+    high = math.inf if high is None else high
+    # Steps count from the minimum, like the sliders that send these values
+    base = 0 if low == -math.inf else low
+
+    def coerce(value):
+        value = parse(value)
+        if step:
+            value = base + round((value - base) / step) * step
+        return cast(max(low, min(high, value)))
+    return coerce
+
+
+class ComponentGroup:
+    """All units of one component type, laid out as contiguous state columns per field."""
+
+    def __init__(self, component_type, ids):
+        self.type = component_type
+        self.ids = ids
+        self.slices = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class StepEngine:
+    """Vectorized machine model built from the `components` of the structure files.
+
+    The whole machine state is one float64 matrix of shape (batch, keys). Keys are
+    ordered by component type and field, so every field of a group is a contiguous
+    column slice and the step rules run as array operations on views of that matrix,
+    independent of how many units of each type exist. Booleans are stored as 0/1.
+    """
+
+    def __init__(self, components, connections=None, initial=None, batch=1, rng=None):
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.batch = batch
+        self.groups = {}
+        self.keys = []
+        self.kinds = []
+        self.key_types = {}
+
+        by_type = {}
+        passive = []
+        for component in components:
+            component_type = component.get("type")
+            if component_type in IGNORED_TYPES:
+                continue
+            if component_type in COMPONENT_FIELDS:
+                by_type.setdefault(component_type, []).append(component["id"])
+            else:
+                passive.append(component)
+
+        defaults = []
+        for component_type, fields in COMPONENT_FIELDS.items():
+            group = ComponentGroup(component_type, by_type.get(component_type, []))
+            self.groups[component_type] = group
+            for field, kind in fields.items():
+                start = len(self.keys)
+                for unit_id in group.ids:
+                    key = f"{unit_id}.{field}"
+                    self.keys.append(key)
+                    self.kinds.append(kind)
+                    self.key_types[key] = component_type
+                    defaults.append(TYPE_DEFAULTS[component_type][field])
+                group.slices[field] = slice(start, len(self.keys))
+
+        # Gauges, sliders and other display components have no rules; their
+        # properties are plain state that only the API reads and writes
+        for component in passive:
+            for prop in component.get("properties", []):
+                if prop.get("type") == "text":
+                    continue
+                key = f"{component['id']}.{prop['key']}"
+                kind = bool if prop.get("type") == "boolean" else int
+                self.keys.append(key)
+                self.kinds.append(kind)
+                self.key_types[key] = component.get("type")
+                defaults.append(True if kind is bool else prop.get("min", 0))
+
+        self.index = {key: i for i, key in enumerate(self.keys)}
+        self.casters = [_CASTERS[kind] for kind in self.kinds]
+        # Compiled once, so API writes are a single call per key
+        self.limits = {key: limits for key, limits in property_limits(components).items() if key in self.index}
+        self.coercers = [_make_coercer(kind, self.limits.get(key)) for key, kind in zip(self.keys, self.kinds)]
+        self.state = np.tile(np.array(defaults, dtype=np.float64), (batch, 1))
+        self.extras = [{} for _ in range(batch)]
+
+        if initial:
+            for key, value in initial.items():
+                if key in self.index:
+                    self.state[:, self.index[key]] = float(value)
+                else:
+                    for extra in self.extras:
+                        extra[key] = value
+
+        self._build_views()
+        self._build_topology(connections or [])
+
+    def _build_views(self):
+        # The state matrix is only ever written in place, so its field views can be kept
+        self._views = {
+            (component_type, name): self.state[:, field_slice]
+            for component_type, group in self.groups.items()
+            for name, field_slice in group.slices.items()
+        }
+
+    def copy(self, rng=None):
+        """Engine with its own copy of the state and extras, sharing the (read-only) layout and wiring."""
+        engine = copy.copy(self)
+        engine.rng = rng if rng is not None else self.rng
+        engine.state = self.state.copy()
+        engine.extras = [dict(extra) for extra in self.extras]
+        engine._build_views()
+        return engine
+
+    @classmethod
+    def from_structures(cls, structures, **kwargs):
+        """Build an engine from several structure dicts (e.g. machine1.json and labor.json)."""
+        components = []
+        connections = []
+        seen = set()
+        for structure in structures:
+            for component in structure.get("components", []):
+                if component.get("id") in seen:
+                    continue
+                seen.add(component.get("id"))
+                components.append(component)
+            connections.extend(structure.get("connections", []))
+        return cls(components, connections, **kwargs)
+
+    def _link_matrix(self, connections, source_type, target_type, fallback):
+        """0/1 matrix (sources, targets) of connections between two component types.
+
+        When the structure has no connection between the two types at all, `fallback`
+        decides the wiring: "all" connects every source to every target and "pairwise"
+        connects the n-th source to the n-th target.
+        """
+        sources = self.groups[source_type].ids
+        targets = self.groups[target_type].ids
+        matrix = np.zeros((len(sources), len(targets)))
+        source_pos = {unit_id: i for i, unit_id in enumerate(sources)}
+        target_pos = {unit_id: i for i, unit_id in enumerate(targets)}
+        for connection in connections:
+            i = source_pos.get(connection.get("from"))
+            j = target_pos.get(connection.get("to"))
+            if i is not None and j is not None:
+                matrix[i, j] = 1
+        if not matrix.any():
+            if fallback == "all":
+                matrix[:] = 1
+            else:
+                for i in range(min(len(sources), len(targets))):
+                    matrix[i, i] = 1
+        return matrix
+
+    def _build_topology(self, connections):
+        self.chemical_to_mixer = self._link_matrix(connections, "chemical", "mixer", "all")
+        self.generator_to_akku = self._link_matrix(connections, "generator", "battery", "pairwise")
+        self.akku_to_aggregator = self._link_matrix(connections, "battery", "aggregator", "all")
+        self.producer_to_counter = self._link_matrix(connections, "producer", "counter", "all")
+        aggregator_to_producer = self._link_matrix(connections, "aggregator", "producer", "all")
+        # Each producer draws from the first aggregator wired to it (-1 if none)
+        self.producer_source = np.where(
+            aggregator_to_producer.any(axis=0), aggregator_to_producer.argmax(axis=0), -1
+        )
+        # Precomputed so a tick does not rebuild them
+        self.mixer_to_chemical = np.ascontiguousarray(self.chemical_to_mixer.T)
+        self._producers = [
+            (p, source, self.akku_to_aggregator[:, source] > 0 if source >= 0 else None)
+            for p, source in enumerate(self.producer_source.tolist())
+        ]
+
+    def component_type(self, key):
+        """Component type owning `key`, or None for keys not in the structure."""
+        return self.key_types.get(key)
+
+    def field(self, component_type, name):
+        """Writable (batch, units) view of one field of a component group."""
+        return self._views[component_type, name]
+
+    # Step rules in the order they run within a tick, see step_<name>
+    SUBSYSTEMS = ("chemicals", "mixers", "generators", "power", "room")
+
+    def step(self, subsystems=None):
+        """Advance every unit of every batch row by one tick.
+
+        `subsystems` restricts the tick to some of SUBSYSTEMS; they still run in
+        their fixed order.
+        """
+        if subsystems is None:
+            self.step_chemicals()
+            self.step_mixers()
+            self.step_generators()
+            self.step_power()
+            self.step_room()
+            return
+        for name in self.SUBSYSTEMS:
+            if name in subsystems:
+                getattr(self, f"step_{name}")()
+
+    def step_chemicals(self):
+        views = self._views
+        value = views["chemical", "value"]
+        purity = views["chemical", "purity"]
+        active = views["chemical", "active"] > 0.5
+
+        # Slowly decrease fill level when inactive
+        if not active.all():
+            drained = (value - 0.2).round(1)
+            np.maximum(0, drained, out=drained)
+            np.copyto(value, drained, where=~active & (value > 0))
+
+        # Randomly fluctuate purity when active
+        drift = self.rng.uniform(-0.5, 0.5, size=purity.shape)
+        fluctuated = (purity + drift).round(1)
+        np.minimum(np.maximum(fluctuated, 70, out=fluctuated), 100, out=fluctuated)
+        np.copyto(purity, fluctuated, where=active)
+
+    def step_mixers(self):
+        views = self._views
+        quality = views["mixer", "mixture_quality"]
+        value = views["chemical", "value"]
+        output = views["chemical", "output"]
+        chemical_active = views["chemical", "active"] > 0.5
+
+        # Only active chemicals with enough fill level contribute to the mixture
+        contributing = output * (chemical_active & (value > 10))
+        total_output = contributing @ self.chemical_to_mixer
+        weighted_purity = (contributing * views["chemical", "purity"]) @ self.chemical_to_mixer
+        mixing = (views["mixer", "active"] > 0.5) & (total_output > 0)
+
+        # Rows that are not mixing keep their weighted purity here; their quality is set to 0 below
+        base_quality = np.divide(weighted_purity, total_output, out=weighted_purity, where=mixing)
+        # Penalty if total output exceeds max throughput
+        throughput_penalty = (total_output - views["mixer", "max_throughput"]) / 10
+        np.maximum(0, throughput_penalty, out=throughput_penalty)
+        noise = self.rng.uniform(-2, 2, size=quality.shape)
+        mixed = (base_quality - throughput_penalty + noise).round(1)
+        np.minimum(np.maximum(mixed, 0, out=mixed), 100, out=mixed)
+        np.copyto(mixed, 0, where=~mixing)
+        quality[...] = mixed
+
+        # Consume chemicals based on their output levels, once per mixer that drew from them
+        consumption_rate = 0.1
+        draws = mixing @ self.mixer_to_chemical
+        consumed = (value - (output / 100) * consumption_rate * draws).round(1)
+        np.maximum(0, consumed, out=consumed)
+        np.copyto(value, consumed, where=chemical_active & (value > 0) & (draws > 0))
+
+    def step_generators(self):
+        views = self._views
+        value = views["generator", "value"]
+        temp = views["generator", "temp"]
+        active = views["generator", "active"]
+        running = active > 0.5
+
+        # Inactive generators produce nothing and cool down towards room level
+        if not running.all():
+            stopped = ~running
+            np.copyto(value, 0, where=stopped)
+            np.copyto(temp, (temp - 0.1).round(2), where=stopped & (temp > 20))
+        heated = temp + (value - 3) / 20
+        np.maximum(20, heated, out=heated)
+        np.copyto(temp, heated.round(2), where=running)
+
+        # Overheated generators trip
+        np.copyto(active, 0, where=temp > 120)
+
+    def step_power(self):
+        views = self._views
+        akku_value = views["battery", "value"]
+        akku_capacity = views["battery", "capacity"]
+        akku_active = views["battery", "active"] > 0.5
+        aggregator_value = views["aggregator", "value"]
+        aggregator_active = views["aggregator", "active"] > 0.5
+        producer_output = views["producer", "output"]
+
+        # Akkus charge from their generators up to capacity
+        charged = views["generator", "value"] @ self.generator_to_akku
+        charged += akku_value
+        np.minimum(charged, akku_capacity, out=charged)
+        np.copyto(akku_value, charged, where=akku_active & (akku_value < akku_capacity))
+
+        # Aggregators sum the charge of their active akkus
+        available = akku_value * akku_active
+        aggregator_value[...] = available @ self.akku_to_aggregator
+        np.copyto(aggregator_value, 0, where=~aggregator_active)
+
+        if self._producers:
+            producer_active = views["producer", "active"] > 0.5
+            consumption = views["producer", "consumption"]
+        for p, source, feeds in self._producers:
+            if source < 0:
+                producer_output[:, p] = 0
+                continue
+            producing = (
+                producer_active[:, p]
+                & aggregator_active[:, source]
+                & (aggregator_value[:, source] >= consumption[:, p])
+            )
+            producer_output[:, p] = producing
+            if not producing.any():
+                continue
+
+            # Drain the consumed amount from one randomly chosen charged akku
+            eligible = akku_active & (akku_value > 0) & feeds
+            candidates = eligible.sum(axis=1)
+            draining = producing & (candidates > 0)
+            if draining.any():
+                pick = np.floor(self.rng.random(self.batch) * candidates)
+                # One-hot per row: the eligible akku where the running count passes the pick
+                chosen = eligible & (np.cumsum(eligible, axis=1) == (pick + 1)[:, None])
+                chosen &= draining[:, None]
+                amount = np.minimum(consumption[:, p:p + 1], akku_value)
+                amount *= chosen
+                akku_value -= amount
+
+            # Recalculate aggregator value after draining
+            recalculated = (akku_value * akku_active) @ self.akku_to_aggregator[:, source]
+            np.copyto(aggregator_value[:, source], recalculated, where=producing)
+
+        views["counter", "value"] += producer_output @ self.producer_to_counter
+
+    def step_room(self):
+        views = self._views
+        generator_temp = views["generator", "temp"]
+        room_temp = views["environment", "temp"]
+        generators = generator_temp.shape[1]
+        if generators == 0 or room_temp.shape[1] == 0:
+            return
+        # The same sum and division as mean(axis=1), without its overhead
+        room_temp[...] = (generator_temp.sum(axis=1) / generators).round(2)[:, None]
+
+        # Room temperature effect on akkus
+        np.copyto(views["battery", "active"], 0, where=room_temp[:, :1] > 110)
+
+
+class VariableView(MutableMapping):
+    """Dict-like view of one batch row of a StepEngine, keyed by "<id>.<field>".
+
+    Values come back as bool/int/float according to the key's kind. Keys that are
+    not part of the structure are kept in a plain per-row dict next to the matrix.
+    """
+
+    def __init__(self, engine, row=0):
+        self._engine = engine
+        self._row = row
+        self._extra = engine.extras[row]
+
+    def __getitem__(self, key):
+        i = self._engine.index.get(key)
+        if i is None:
+            return self._extra[key]
+        return self._engine.casters[i](self._engine.state[self._row, i])
+
+    def __setitem__(self, key, value):
+        i = self._engine.index.get(key)
+        if i is None:
+            self._extra[key] = value
+        else:
+            self._engine.state[self._row, i] = float(value)
+
+    def __delitem__(self, key):
+        if key in self._engine.index:
+            raise KeyError(f"Cannot delete structural variable {key}")
+        del self._extra[key]
+
+    def __contains__(self, key):
+        return key in self._engine.index or key in self._extra
+
+    def __iter__(self):
+        yield from self._engine.keys
+        yield from self._extra
+
+    def __len__(self):
+        return len(self._engine.keys) + len(self._extra)
+
+    def kind(self, key):
+        """Python type values of `key` are reported as."""
+        i = self._engine.index.get(key)
+        if i is None:
+            return type(self._extra[key])
+        return self._engine.kinds[i]
+
+    def coerce(self, key, value):
+        """Convert a value coming from the API (often a string) to the type of `key`.
+
+        Also applies the range limits of controllable fields. Raises ValueError if
+        the value cannot be converted.
+        """
+        i = self._engine.index.get(key)
+        if i is not None:
+            return self._engine.coercers[i](value)
+        parse = _PARSERS.get(type(self._extra[key]))
+        return value if parse is None else parse(value)
+
+    def copy(self) -> Dict[str, Any]:
+        engine = self._engine
+        values = engine.state[self._row].tolist()
+        result = {key: cast(v) for key, cast, v in zip(engine.keys, engine.casters, values)}
+        result.update(self._extra)
+        return result
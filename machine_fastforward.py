@@ -0,0 +1,446 @@
+"""Event-driven fast-forward of a MachineSimulator.
+
+Between discrete events (generator trip or reaching room level, akku full or
+empty, room above 110 °C, a tank crossing 10 or running dry) every rule of the
+step engine is linear in the number of ticks, so whole stretches can be advanced
+in closed form. Each leap ends right before the next event and the event tick
+itself is run through the normal engine step, which keeps every discrete
+transition exact.
+
+The stochastic parts are sampled from their distribution over the whole leap
+(tau-leaping) instead of tick by tick:
+
+- Akku drain: the number of times each eligible akku is picked is multinomial.
+  This is exact as long as no akku can run low inside the leap; leaps that would
+  violate that are halved and resampled, and fall back to exact ticks.
+- Chemical purity: a clipped ±0.5 random walk, approximated by reflected
+  Brownian motion with the same variance (k/12 after k ticks). The error is
+  bounded by one 0.5 step near the 70/100 limits.
+- Saturated akkus: an akku that recharges faster than its share of the
+  consumption only fluctuates just below capacity once it got there. Leaps
+  keep it where it is, which is off by at most SATURATION_BAND drains.
+- Starved producer: when the akkus feeding the producer charge less per tick
+  than it consumes and their store is used up, their levels fluctuate around
+  a steady band and the producer runs on some ticks only. Partial drains make
+  that rate hard to derive, so it is measured over CALIBRATION_TICKS exact
+  ticks for every charging setup. Measurements taken while the store was
+  still running down are discarded. Leaps then sample the production count
+  as binomial with that rate and leave the feeding akkus at their current
+  levels, which are a sample of the band.
+- Mixture quality is re-drawn every tick anyway and comes from the final
+  exact tick of each leap.
+"""
+import math
+import time
+import numpy as np
+
+PURITY_MIN = 70
+PURITY_MAX = 100
+TRIP_TEMP = 120
+ROOM_TEMP = 20
+AKKU_CUTOFF_TEMP = 110
+CHEMICAL_MIN_LEVEL = 10
+
+# Leaps shorter than this are not worth the bookkeeping; they run as exact ticks
+MIN_LEAP = 2
+# How often a rejected akku-drain sample is halved and retried before giving up
+MAX_RESAMPLES = 6
+# Most exact ticks run in a row before looking for a leap again
+MAX_BACKOFF = 64
+# Longest fast_forward holds the simulator lock at a time, in seconds
+LOCK_SECONDS = 0.05
+# Error bound of the saturated-akku approximation, in drains below capacity
+SATURATION_BAND = 4
+# Exact ticks measured before a starved producer's production rate is used
+CALIBRATION_TICKS = 256
+
+
+def _ticks_to_cross(distance, rate):
+    """Ticks until something moving by `rate` per tick has moved `distance`.
+
+    Rounds towards the earlier tick: arriving one tick early at an event only
+    costs an exact tick, arriving late would skip the event.
+    """
+    if rate <= 0:
+        return math.inf
+    return max(1, math.ceil(distance / rate - 1e-9))
+
+
+def _fold(values, low, high):
+    """Reflect values back into [low, high], as reflected Brownian motion does."""
+    span = high - low
+    folded = np.mod(values - low, 2 * span)
+    return low + np.where(folded > span, 2 * span - folded, folded)
+
+
+class FastForward:
+    """Closed-form leaps over a single-machine StepEngine (batch row 0)."""
+
+    def __init__(self, engine, max_leap=None):
+        if engine.batch != 1:
+            raise ValueError("Fast-forward works on single-machine engines only")
+        self.engine = engine
+        self.rng = engine.rng
+        self.max_leap = max_leap
+        self.leaps = 0
+        self.leapt_ticks = 0
+        self.exact_ticks = 0
+        self.events = []
+        # Production rate of a starved producer per charging setup, see _starved_key
+        self.starved_rates = {}
+        self._calibration = {}
+
+    def _row(self, component_type, name):
+        return self.engine.field(component_type, name)[0]
+
+    def run(self, cycles, first_cycle=1, deadline=None):
+        """Advance up to `cycles` ticks and return how many were run.
+
+        With a `deadline` (a time.perf_counter() value) the run stops at the first
+        leap or event boundary after it. `first_cycle` only numbers the recorded events.
+        """
+        done = 0
+        backoff = 1
+        while done < cycles and (deadline is None or time.perf_counter() < deadline):
+            remaining = cycles - done
+            ticks, event = self.next_event()
+            leap = min(ticks - 1, remaining - 1)
+            if self.max_leap is not None:
+                leap = min(leap, self.max_leap)
+            leapt = self.leap(int(leap)) if leap >= MIN_LEAP else 0
+
+            # The event tick (or the last tick of the run) is always exact. When no
+            # leap was possible, keep stepping exactly for a while before checking
+            # again, so chattering states do not pay for event detection every tick.
+            if leapt:
+                exact = 1
+                backoff = 1
+            else:
+                exact = min(backoff, remaining)
+                backoff = min(2 * backoff, MAX_BACKOFF)
+            starved = self._starved_key()
+            if starved is not None and starved not in self.starved_rates:
+                self._calibrate(starved, exact)
+            else:
+                for _ in range(exact):
+                    self.engine.step()
+            self.exact_ticks += exact
+            done += leapt + exact
+            if leapt and leapt == ticks - 1 and event:
+                self.events.append({"cycle": first_cycle + done - 1, "event": event})
+        return done
+
+    def _generator_rates(self):
+        """Per-tick temperature change of every generator and the ticks until it changes."""
+        value = self._row("generator", "value")
+        temp = self._row("generator", "temp")
+        running = self._row("generator", "active") > 0.5
+        rates = np.zeros(len(temp))
+        events = []
+        for g in range(len(temp)):
+            unit = self.engine.groups["generator"].ids[g]
+            if running[g]:
+                rate = (value[g] - 3) / 20
+                if temp[g] > TRIP_TEMP:
+                    events.append((1, f"{unit} trip"))
+                elif temp[g] < ROOM_TEMP:
+                    # Clamped up to room level on the next tick
+                    events.append((1, None))
+                elif rate > 0:
+                    rates[g] = rate
+                    events.append((_ticks_to_cross(TRIP_TEMP - temp[g], rate), f"{unit} trip"))
+                elif rate < 0 and temp[g] > ROOM_TEMP:
+                    rates[g] = rate
+                    events.append((_ticks_to_cross(temp[g] - ROOM_TEMP, -rate), f"{unit} at room level"))
+            elif value[g] != 0:
+                # Just tripped; the next exact tick zeroes its output
+                events.append((1, f"{unit} stopped"))
+            elif temp[g] > ROOM_TEMP:
+                rates[g] = -0.1
+                events.append((_ticks_to_cross(temp[g] - ROOM_TEMP, 0.1), f"{unit} cooled down"))
+        return rates, events
+
+    def _chemical_rates(self):
+        """Per-tick fill level decrease of every chemical and the ticks until a level event."""
+        engine = self.engine
+        value = self._row("chemical", "value")
+        output = self._row("chemical", "output")
+        active = self._row("chemical", "active") > 0.5
+        mixer_active = self._row("mixer", "active") > 0.5
+
+        contributing = output * (active & (value > CHEMICAL_MIN_LEVEL))
+        mixing = mixer_active & (contributing @ engine.chemical_to_mixer > 0)
+        draws = mixing.astype(np.float64) @ engine.chemical_to_mixer.T
+
+        step = np.where(active, output / 100 * 0.1 * draws, 0.2)
+        draining = np.where(active, draws > 0, True) & (value > 0)
+        # Fill levels are rounded to 0.1 every tick, so the effective decrease is the
+        # rounded one; it must be the same on the following tick to be linear
+        once = value - np.maximum(0, np.round(value - step, 1))
+        twice = (value - once) - np.maximum(0, np.round(value - once - step, 1))
+        rates = np.where(draining, once, 0)
+        events = []
+        for c in np.flatnonzero(draining & (once > 0)).tolist():
+            unit = engine.groups["chemical"].ids[c]
+            if abs(once[c] - twice[c]) > 1e-9:
+                events.append((1, None))
+                continue
+            events.append((_ticks_to_cross(value[c], once[c]), f"{unit} empty"))
+            if active[c] and value[c] > CHEMICAL_MIN_LEVEL:
+                events.append((_ticks_to_cross(value[c] - CHEMICAL_MIN_LEVEL, once[c]), f"{unit} low"))
+        return rates, events
+
+    def _akku_charge(self, below_capacity=True):
+        """Per-tick charge of every akku; akkus at capacity do not charge."""
+        engine = self.engine
+        generator_value = self._row("generator", "value") * (self._row("generator", "active") > 0.5)
+        charge = (generator_value @ engine.generator_to_akku) * (self._row("battery", "active") > 0.5)
+        if below_capacity:
+            charge = charge * (self._row("battery", "value") < self._row("battery", "capacity"))
+        return charge
+
+    def next_event(self):
+        """Return (ticks, description) of the next tick with a discrete transition."""
+        _, generator_events = self._generator_rates()
+        _, chemical_events = self._chemical_rates()
+        events = generator_events + chemical_events
+
+        value = self._row("battery", "value")
+        capacity = self._row("battery", "capacity")
+        charge = self._akku_charge()
+        charging = (charge > 0) & (value < capacity)
+        saturated = self._saturated()
+        if saturated is not None:
+            charging &= ~saturated
+        for a in np.flatnonzero(charging).tolist():
+            unit = self.engine.groups["battery"].ids[a]
+            events.append((_ticks_to_cross(capacity[a] - value[a], charge[a]), f"{unit} full"))
+
+        # Room temperature above the cutoff disables all akkus
+        rates, _ = self._generator_rates()
+        temp = self._row("generator", "temp")
+        akkus_active = (self._row("battery", "active") > 0.5).any()
+        if len(temp) and len(self._row("environment", "temp")) and akkus_active:
+            mean_temp = temp.mean()
+            if mean_temp > AKKU_CUTOFF_TEMP:
+                events.append((1, "room overheated"))
+            else:
+                events.append((_ticks_to_cross(AKKU_CUTOFF_TEMP - mean_temp, rates.mean()), "room overheated"))
+
+        if not events:
+            return math.inf, None
+        return min(events, key=lambda event: event[0])
+
+    def _producer(self):
+        """(consumption, akkus feeding the producer) or None if nothing can be produced."""
+        engine = self.engine
+        if len(engine.producer_source) != 1:
+            return None
+        source = engine.producer_source[0]
+        consumption = self._row("producer", "consumption")[0]
+        if source < 0 or consumption <= 0 or self._row("producer", "active")[0] < 0.5 \
+                or self._row("aggregator", "active")[source] < 0.5:
+            return None
+        feeding = (self._row("battery", "active") > 0.5) & (engine.akku_to_aggregator[:, source] > 0)
+        return consumption, feeding
+
+    def _saturated(self):
+        """Akkus held near capacity because they recharge faster than they are drained.
+
+        An akku that recharges more than its share of the producer's consumption
+        only fluctuates a few drains below capacity once it got there, and while
+        any such akku exists the producer runs every tick. Returns the mask of
+        those akkus, or None.
+        """
+        producer = self._producer()
+        if producer is None:
+            return None
+        consumption, feeding = producer
+        value = self._row("battery", "value")
+        capacity = self._row("battery", "capacity")
+        full_charge = self._akku_charge(below_capacity=False)
+        candidates = feeding & ((value > 0) | (full_charge > 0))
+        saturated = candidates & (full_charge * candidates.sum() > consumption) \
+            & (value >= capacity - SATURATION_BAND * consumption)
+        if value[saturated].sum() < (SATURATION_BAND + 1) * consumption:
+            return None
+        return saturated
+
+    def _starved_key(self):
+        """Charging setup of a producer that consumes more than its akkus charge, or None."""
+        producer = self._producer()
+        if producer is None or len(self.engine.producer_source) != 1:
+            return None
+        consumption, feeding = producer
+        charge = self._akku_charge() * feeding
+        if charge.sum() >= consumption:
+            return None
+        return float(consumption), tuple(feeding.tolist()), tuple(charge.tolist())
+
+    def _calibrate(self, key, ticks):
+        """Run `ticks` exact ticks, counting productions towards the rate of `key`."""
+        consumption, feeding, charge = key
+        feeding = np.array(feeding)
+        value = self._row("battery", "value")
+        output = self._row("producer", "output")
+        measured = self._calibration.setdefault(key, [0, 0, (value * feeding).sum()])
+        for _ in range(ticks):
+            self.engine.step()
+            measured[1] += output[0] > 0.5
+        measured[0] += ticks
+        if measured[0] < CALIBRATION_TICKS:
+            return
+        # A store still running down loses about (consumption - charge) per tick;
+        # in the steady band the level only fluctuates
+        drift = abs((value * feeding).sum() - measured[2]) / measured[0]
+        if drift < (consumption - sum(charge)) / 4:
+            self.starved_rates[key] = measured[1] / measured[0]
+        else:
+            del self._calibration[key]
+
+    def _production(self, ticks):
+        """Sample `ticks` ticks of charging and production.
+
+        Returns (productions, akku values after the leap), or None when the leap
+        cannot be taken in closed form.
+        """
+        production = self._linear_production(ticks)
+        if production is not None:
+            return production
+        starved = self._starved_key()
+        rate = self.starved_rates.get(starved)
+        if rate is None:
+            return None
+        feeding = np.array(starved[1])
+        value = self._row("battery", "value")
+        result = value + self._akku_charge() * ticks
+        result[feeding] = value[feeding]
+        return int(self.rng.binomial(ticks, rate)), result
+
+    def _linear_production(self, ticks):
+        """_production for akkus that are drained by the full consumption every time."""
+        value = self._row("battery", "value")
+        capacity = self._row("battery", "capacity")
+        charge = self._akku_charge()
+        charged = value + charge * ticks
+        if len(self.engine.producer_source) > 1:
+            return None
+        producer = self._producer()
+        if producer is None:
+            return 0, charged
+        consumption, feeding = producer
+
+        saturated = self._saturated()
+        if saturated is not None:
+            productions = ticks
+        else:
+            saturated = np.zeros(len(value), dtype=bool)
+            # Aggregator level A grows by the total charge C per tick and drops by the
+            # consumption P whenever it is at least P, so after k ticks the producer
+            # has run min(k, floor((A0 + C k) / P)) times
+            stored = (value * feeding).sum()
+            total_charge = (charge * feeding).sum()
+            productions = int(min(ticks, math.floor((stored + total_charge * ticks) / consumption)))
+            if productions == 0:
+                return 0, charged
+
+        # Other akkus sitting at capacity only refill what was drained, which is not linear
+        if (feeding & ~saturated & (value >= capacity) & (self._akku_charge(below_capacity=False) > 0)).any():
+            return None
+
+        candidates = np.flatnonzero(feeding & ((value > 0) | (charge > 0) | saturated))
+        if len(candidates) == 0:
+            return None
+        drains = np.zeros(len(value))
+        drains[candidates] = self.rng.multinomial(productions, np.full(len(candidates), 1 / len(candidates)))
+        # Every drain must take the full consumption, even if all of them came first,
+        # and no akku may drop out of the candidates before the last drain
+        linear = ~saturated[candidates]
+        left = (value - consumption * drains)[candidates]
+        if ((left < 0) & linear).any() \
+                or ((left == 0) & linear & (charge[candidates] == 0) & (drains[candidates] > 0)).any():
+            return None
+
+        result = charged - consumption * drains
+        # Saturated levels stay within SATURATION_BAND drains of capacity; keep them
+        result[saturated] = value[saturated]
+        return productions, result
+
+    def leap(self, ticks):
+        """Advance up to `ticks` ticks in closed form; returns how many were advanced."""
+        production = None
+        for _ in range(MAX_RESAMPLES):
+            production = self._production(ticks)
+            if production is not None:
+                break
+            ticks //= 2
+            if ticks < MIN_LEAP:
+                return 0
+        if production is None:
+            return 0
+        productions, akku_values = production
+
+        engine = self.engine
+        generator_rates, _ = self._generator_rates()
+        chemical_rates, _ = self._chemical_rates()
+
+        # Generators and room
+        temp = self._row("generator", "temp")
+        temp[:] = np.round(temp + generator_rates * ticks, 2)
+        room_temp = self._row("environment", "temp")
+        if len(temp) and len(room_temp):
+            room_temp[:] = round(temp.mean(), 2)
+
+        # Chemicals
+        value = self._row("chemical", "value")
+        value[:] = np.maximum(0, np.round(value - chemical_rates * ticks, 1))
+        purity = self._row("chemical", "purity")
+        active = self._row("chemical", "active") > 0.5
+        spread = self.rng.normal(0, math.sqrt(ticks / 12), size=purity.shape)
+        walked = np.round(_fold(purity + spread, PURITY_MIN, PURITY_MAX), 1)
+        purity[:] = np.where(active, walked, purity)
+
+        # Akkus, aggregators and production
+        akku_value = self._row("battery", "value")
+        akku_value[:] = akku_values
+        akku_active = self._row("battery", "active") > 0.5
+        aggregator_value = self._row("aggregator", "value")
+        aggregator_active = self._row("aggregator", "active") > 0.5
+        aggregator_value[:] = np.where(aggregator_active, (akku_value * akku_active) @ engine.akku_to_aggregator, 0)
+        if productions:
+            self._row("counter", "value")[:] += productions * engine.producer_to_counter[0]
+
+        self.leaps += 1
+        self.leapt_ticks += ticks
+        return ticks
+
+
+def fast_forward(simulator, cycles, max_leap=None):
+    """Advance `simulator` by `cycles` ticks, leaping between events.
+
+    The simulator lock is released at the first leap or event boundary after
+    LOCK_SECONDS, so a running simulation keeps ticking and applying updates
+    during a long fast-forward. The result is published as a single version at
+    the end. Returns a report with the number of leaps, leapt and exact ticks and
+    the events the leaps stopped at.
+    """
+    forwards = []
+    done = 0
+    while done < cycles:
+        with simulator.lock:
+            # A restore or structure reload may have replaced the engine meanwhile
+            if not forwards or forwards[-1].engine is not simulator.engine:
+                forwards.append(FastForward(simulator.engine, max_leap))
+            ran = forwards[-1].run(cycles - done, simulator.cycle_count + 1,
+                                   deadline=time.perf_counter() + LOCK_SECONDS)
+            simulator.cycle_count += ran
+            done += ran
+            if done >= cycles:
+                simulator._record_changes()
+    return {
+        "cycles": cycles,
+        "leaps": sum(forward.leaps for forward in forwards),
+        "leapt_ticks": sum(forward.leapt_ticks for forward in forwards),
+        "exact_ticks": sum(forward.exact_ticks for forward in forwards),
+        "events": [event for forward in forwards for event in forward.events],
+    }
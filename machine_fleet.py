@@ -0,0 +1,110 @@
+import time
+import threading
+import numpy as np
+from collections import deque
+from machine_engine import StepEngine, VariableView
+
+
+class MachineFleet:
+    """Many independent machines stepped together in one process.
+
+    All machines share one StepEngine whose batch dimension holds one row per
+    machine, so a tick of the whole fleet is a single pass of array operations
+    instead of one Python thread per machine.
+    """
+
+    def __init__(self, size, structures, initial=None, tick_interval=0.3, rate_window=100, seed=None):
+        self.rng = np.random.default_rng(seed)
+        self.engine = StepEngine.from_structures(structures, initial=initial, batch=size, rng=self.rng)
+        self.machine_ids = [str(i) for i in range(size)]
+        self.rows = {machine_id: row for row, machine_id in enumerate(self.machine_ids)}
+        self.views = [VariableView(self.engine, row) for row in range(size)]
+        self.tick_interval = tick_interval
+        self.cycle_count = 0
+        self.running = False
+        self.lock = threading.Lock() # Lock for thread-safe access to the fleet state
+        self._tick_times = deque(maxlen=rate_window)
+        self._step_seconds = 0.0
+
+    def __len__(self):
+        return len(self.machine_ids)
+
+    def __contains__(self, machine_id):
+        return machine_id in self.rows
+
+    def status_dict(self, machine_id):
+        with self.lock:
+            return self.views[self.rows[machine_id]].copy()
+
+    def update_variables(self, machine_id, data):
+        """Apply a dict of API updates to one machine; returns the keys that were updated."""
+        variables = self.views[self.rows[machine_id]]
+        updated_keys = []
+        with self.lock:
+            for key, value in data.items():
+                if key not in variables:
+                    continue
+                try:
+                    variables[key] = variables.coerce(key, value)
+                except (TypeError, ValueError):
+                    continue
+                updated_keys.append(key)
+                # An inactive generator stops producing immediately
+                if key.endswith(".active") and not variables[key] \
+                        and self.engine.component_type(key) == "generator":
+                    variables[key.replace(".active", ".value")] = 0
+        return updated_keys
+
+    def step(self):
+        start_time = time.perf_counter()
+        with self.lock:
+            self.engine.step()
+            self.cycle_count += 1
+        end_time = time.perf_counter()
+        self._step_seconds = end_time - start_time
+        self._tick_times.append(end_time)
+
+    @property
+    def tick_rate(self):
+        """Sustained fleet ticks per second over the recent window."""
+        if len(self._tick_times) < 2:
+            return 0.0
+        span = self._tick_times[-1] - self._tick_times[0]
+        return (len(self._tick_times) - 1) / span if span > 0 else 0.0
+
+    def stats(self):
+        tick_rate = self.tick_rate
+        return {
+            "machines": len(self),
+            "cycle_count": self.cycle_count,
+            "tick_interval": self.tick_interval,
+            "tick_rate": tick_rate,
+            "machine_ticks_per_second": tick_rate * len(self),
+            "last_step_seconds": self._step_seconds,
+        }
+
+    def run_simulation_loop(self):
+        self.running = True
+        print(f"Fleet simulation loop started with {len(self)} machines.")
+        try:
+            while self.running:
+                start_time = time.perf_counter()
+                self.step()
+                # A tick interval of 0 runs the fleet as fast as it can go
+                sleep_time = self.tick_interval - (time.perf_counter() - start_time)
+                if sleep_time > 0:
+                    time.sleep(sleep_time)
+        except Exception as e:
+            print(f"Error in fleet simulation loop: {e}")
+        finally:
+            print("Fleet simulation loop stopped.")
+
+    def start_simulation(self):
+        if not self.running and len(self):
+            self.simulation_thread = threading.Thread(target=self.run_simulation_loop, daemon=True)
+            self.simulation_thread.start()
+
+    def stop_simulation(self):
+        self.running = False
+        if hasattr(self, 'simulation_thread') and self.simulation_thread.is_alive():
+            self.simulation_thread.join(timeout=1)
@@ -0,0 +1,135 @@
+import threading
+import numpy as np
+
+# name: (bucket width in seconds, number of buckets kept)
+DEFAULT_ROLLUPS = {
+    "10s": (10, 8640),    # one day
+    "1m": (60, 10080),    # one week
+}
+
+
+class _Ring:
+    """Fixed-size ring of rows, one column per variable."""
+
+    def __init__(self, capacity, width, fields):
+        self.capacity = capacity
+        self.timestamps = np.zeros(capacity)
+        self.columns = {field: np.zeros((capacity, width)) for field in fields}
+        self.count = 0  # total rows ever written
+
+    def append(self, timestamp, **rows):
+        i = self.count % self.capacity
+        self.timestamps[i] = timestamp
+        for field, row in rows.items():
+            self.columns[field][i] = row
+        self.count += 1
+
+    def ordered(self):
+        """Indices of the stored rows, oldest first."""
+        if self.count <= self.capacity:
+            return np.arange(self.count)
+        start = self.count % self.capacity
+        return np.concatenate((np.arange(start, self.capacity), np.arange(start)))
+
+
+class _Rollup:
+    """Min/max/mean per fixed time bucket, plus the bucket currently being filled."""
+
+    def __init__(self, seconds, capacity, width):
+        self.seconds = seconds
+        self.ring = _Ring(capacity, width, ("min", "max", "mean"))
+        self.bucket = None
+        self.minimum = np.zeros(width)
+        self.maximum = np.zeros(width)
+        self.total = np.zeros(width)
+        self.samples = 0
+
+    def add(self, timestamp, row):
+        bucket = int(timestamp // self.seconds)
+        if bucket != self.bucket:
+            self.flush()
+            self.bucket = bucket
+            self.minimum[:] = row
+            self.maximum[:] = row
+            self.total[:] = row
+            self.samples = 1
+            return
+        np.minimum(self.minimum, row, out=self.minimum)
+        np.maximum(self.maximum, row, out=self.maximum)
+        self.total += row
+        self.samples += 1
+
+    def flush(self):
+        if self.samples:
+            self.ring.append(self.bucket * self.seconds, min=self.minimum, max=self.maximum,
+                             mean=self.total / self.samples)
+            self.samples = 0
+
+
+class HistoryBuffer:
+    """Bounded in-memory history of every structural variable.
+
+    Raw samples go into a ring with one column per key, and every sample is also
+    folded into coarser min/max/mean rollups. All rings are preallocated, so
+    memory stays constant however long the simulator runs; the oldest data is
+    overwritten first. Booleans are stored as 0/1.
+    """
+
+    def __init__(self, keys, raw_capacity=4000, rollups=None):
+        self.keys = list(keys)
+        self.index = {key: i for i, key in enumerate(self.keys)}
+        self.raw = _Ring(raw_capacity, len(self.keys), ("value",))
+        self.rollups = {
+            name: _Rollup(seconds, capacity, len(self.keys))
+            for name, (seconds, capacity) in (rollups or DEFAULT_ROLLUPS).items()
+        }
+        self.lock = threading.Lock() # Own lock so readers never block the simulation lock
+
+    @property
+    def resolutions(self):
+        return ["raw"] + list(self.rollups)
+
+    def record(self, timestamp, row):
+        with self.lock:
+            self.raw.append(timestamp, value=row)
+            for rollup in self.rollups.values():
+                rollup.add(timestamp, row)
+
+    def query(self, keys=None, start=None, end=None, resolution="raw"):
+        """Return the history of `keys` between unix times `start` and `end`.
+
+        Raw resolution gives {"timestamps": [...], "series": {key: [...]}}; rollups
+        give {"timestamps": bucket starts, "series": {key: {"min", "max", "mean"}}}.
+        Raises KeyError for unknown keys or resolutions.
+        """
+        keys = self.keys if keys is None else list(keys)
+        columns = [self.index[key] for key in keys]
+        rollup = None if resolution == "raw" else self.rollups[resolution]
+        ring = self.raw if rollup is None else rollup.ring
+
+        with self.lock:
+            order = ring.ordered()
+            timestamps = ring.timestamps[order]
+            # Timestamps are increasing, so the time range is two binary searches
+            first = 0 if start is None else np.searchsorted(timestamps, start, side="left")
+            last = len(timestamps) if end is None else np.searchsorted(timestamps, end, side="right")
+            rows = order[first:last]
+            data = {field: values[rows][:, columns] for field, values in ring.columns.items()}
+            timestamps = timestamps[first:last]
+            # The bucket still being filled is reported too, so rollups are never empty
+            if rollup is not None and rollup.samples:
+                bucket_start = rollup.bucket * rollup.seconds
+                if (start is None or bucket_start >= start) and (end is None or bucket_start <= end):
+                    timestamps = np.append(timestamps, bucket_start)
+                    partial = {"min": rollup.minimum, "max": rollup.maximum,
+                               "mean": rollup.total / rollup.samples}
+                    data = {field: np.vstack((data[field], partial[field][columns])) for field in data}
+
+        if resolution == "raw":
+            series = {key: data["value"][:, i].tolist() for i, key in enumerate(keys)}
+        else:
+            series = {
+                key: {field: data[field][:, i].tolist() for field in ("min", "max", "mean")}
+                for i, key in enumerate(keys)
+            }
+        return {"resolution": resolution, "timestamps": timestamps.tolist(), "series": series}
@@ -0,0 +1,154 @@
+"""Load generator simulating dashboards that poll and control the simulator API.
+
+Every dashboard behaves like the frontend: it polls /api/status?since=<version>
+once per second (App.tsx) and now and then posts a control change the way
+ControlPanel.tsx does, followed by an immediate status refresh.
+
+    python machine_loadgen.py --dashboards 50 --duration 30 --output load.json
+
+Without --url an in-process server with a running simulator is started on a
+free port, so runs are self-contained and comparable.
+"""
+import argparse
+import json
+import logging
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+import numpy as np
+
+# Writes ControlPanel.tsx sends from its sliders and toggles
+CONTROL_UPDATES = [
+    ("generator1.value", lambda: random.randint(0, 10)),
+    ("generator2.value", lambda: random.randint(0, 10)),
+    ("producer.consumption", lambda: random.randint(1, 10)),
+    ("chemical1.output", lambda: random.randint(0, 100)),
+    ("power-slider.value", lambda: random.randint(0, 100)),
+]
+
+
+class Dashboard(threading.Thread):
+    def __init__(self, base_url, poll_interval, update_interval, stop_at, samples):
+        super().__init__(daemon=True)
+        self.base_url = base_url
+        self.poll_interval = poll_interval
+        self.update_interval = update_interval
+        self.stop_at = stop_at
+        self.samples = samples
+        self.version = 0
+
+    def request(self, endpoint, path, body=None):
+        data = None if body is None else json.dumps(body).encode()
+        headers = {"Content-Type": "application/json"} if data else {}
+        start_time = time.perf_counter()
+        try:
+            with urllib.request.urlopen(urllib.request.Request(self.base_url + path, data, headers), timeout=10) as response:
+                payload = response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            payload = e.read()
+            status = e.code
+        except OSError:
+            payload = b""
+            status = 0
+        # list.append is atomic, so all dashboards can share one list
+        self.samples.append((endpoint, time.perf_counter() - start_time, status, len(payload)))
+        return status, payload
+
+    def poll(self):
+        status, payload = self.request("GET /api/status", f"/api/status?since={self.version}")
+        if status == 200:
+            self.version = max(self.version, json.loads(payload)["version"])
+
+    def run(self):
+        # Random phases, so the dashboards do not poll in lockstep
+        next_poll = time.perf_counter() + random.uniform(0, self.poll_interval)
+        next_update = time.perf_counter() + random.expovariate(1 / self.update_interval)
+        while True:
+            now = time.perf_counter()
+            if now >= self.stop_at:
+                return
+            if now >= next_update:
+                key, value = random.choice(CONTROL_UPDATES)
+                self.request("POST /api/update", "/api/update", {key: value()})
+                self.poll()
+                next_update = now + random.expovariate(1 / self.update_interval)
+            elif now >= next_poll:
+                self.poll()
+                next_poll += self.poll_interval
+            time.sleep(max(0.0, min(next_poll, next_update, self.stop_at) - time.perf_counter()))
+
+
+def start_local_server():
+    """Serve the Flask app with a running simulator on a free local port; returns its URL."""
+    from werkzeug.serving import make_server
+    from machine_simulator import app, simulator
+    # One log line per request would cost more than the requests themselves
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    simulator.start_simulation()
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+def summarize(samples, duration):
+    report = {}
+    for endpoint in sorted({sample[0] for sample in samples}):
+        rows = [sample for sample in samples if sample[0] == endpoint]
+        latencies = np.array([row[1] for row in rows]) * 1000
+        report[endpoint] = {
+            "requests": len(rows),
+            "errors": sum(1 for row in rows if not 200 <= row[2] < 300),
+            "requests_per_second": len(rows) / duration,
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p99_ms": float(np.percentile(latencies, 99)),
+            "max_ms": float(latencies.max()),
+            "mean_bytes": float(np.mean([row[3] for row in rows])),
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate dashboards polling and updating the simulator API")
+    parser.add_argument("--url", default=None, help="base URL of a running server (default: start one in-process)")
+    parser.add_argument("--dashboards", type=int, default=20, help="number of simulated browser tabs")
+    parser.add_argument("--duration", type=float, default=30, help="seconds to run")
+    parser.add_argument("--poll-interval", type=float, default=1.0, help="seconds between status polls (App.tsx: 1 s)")
+    parser.add_argument("--update-interval", type=float, default=5.0, help="mean seconds between control changes per dashboard")
+    parser.add_argument("--seed", type=int, default=None, help="seed of the dashboards' random choices")
+    parser.add_argument("--output", default=None, help="write the summary as JSON to this file")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    base_url = args.url or start_local_server()
+    samples = []
+    stop_at = time.perf_counter() + args.duration
+    dashboards = [Dashboard(base_url, args.poll_interval, args.update_interval, stop_at, samples)
+                  for _ in range(args.dashboards)]
+    print(f"Running {args.dashboards} dashboards against {base_url} for {args.duration:.0f} s")
+    for dashboard in dashboards:
+        dashboard.start()
+    for dashboard in dashboards:
+        dashboard.join()
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "dashboards": args.dashboards,
+        "duration": args.duration,
+        "poll_interval": args.poll_interval,
+        "update_interval": args.update_interval,
+        "endpoints": summarize(samples, args.duration),
+    }
+    for endpoint, stats in report["endpoints"].items():
+        print(f"{endpoint:18s} {stats['requests']:7d} req  {stats['requests_per_second']:8.1f} req/s  "
+              f"p50 {stats['p50_ms']:7.2f} ms  p99 {stats['p99_ms']:7.2f} ms  errors {stats['errors']}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""Low-overhead runtime metrics, rendered in the Prometheus text format.
+
+Histograms use fixed log-spaced buckets (HDR style): bucket bounds grow by a
+constant factor, so the relative error is the same from microseconds to
+seconds, and an observation is one log, one list increment and no allocation.
+"""
+import math
+import threading
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels) + "}"
+
+
+def _format_value(value):
+    return f"{value:.6g}" if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, labels=()):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items()) or [((), 0)]
+        for labels, value in values:
+            lines.append(f"{self.name}{_format_labels(labels)} {_format_value(value)}")
+        return lines
+
+
+class Gauge:
+    """Value read from `function` at scrape time, so nothing is recorded on the hot path."""
+
+    def __init__(self, name, help, function):
+        self.name = name
+        self.help = help
+        self.function = function
+
+    def render(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge",
+                f"{self.name} {_format_value(self.function())}"]
+
+
+class Histogram:
+    """Log-bucketed histogram of values between `lowest` and `highest`.
+
+    Bucket bounds are lowest * 2 ** (i / per_octave); values above `highest` only
+    land in the +Inf bucket.
+    """
+
+    def __init__(self, name, help, lowest=1e-6, highest=100.0, per_octave=4):
+        self.name = name
+        self.help = help
+        self.lowest = lowest
+        self.per_octave = per_octave
+        self.bounds = [lowest * 2 ** (i / per_octave)
+                       for i in range(int(math.ceil(math.log2(highest / lowest) * per_octave)) + 1)]
+        self._series = {} # labels -> [bucket counts (+Inf last), sum, count]
+        self._lock = threading.Lock()
+
+    def _bucket(self, value):
+        if value <= self.lowest:
+            return 0
+        return min(len(self.bounds), math.ceil(math.log2(value / self.lowest) * self.per_octave))
+
+    def observe(self, value, labels=()):
+        bucket = self._bucket(value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.bounds) + 1), 0.0, 0]
+            series[0][bucket] += 1
+            series[1] += value
+            series[2] += 1
+
+    def quantile(self, q, labels=()):
+        """Upper bound of the bucket holding the q-quantile (None without observations)."""
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                return None
+            counts, _, count = series[0][:], series[1], series[2]
+        rank = q * count
+        seen = 0
+        for i, bucket_count in enumerate(counts):
+            seen += bucket_count
+            if seen >= rank and bucket_count:
+                return self.bounds[i] if i < len(self.bounds) else math.inf
+        return math.inf
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((labels, (counts[:], total, count))
+                            for labels, (counts, total, count) in self._series.items())
+        for labels, (counts, total, count) in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.bounds, counts):
+                cumulative += bucket_count
+                bucket_labels = labels + (("le", f"{bound:.6g}"),)
+                lines.append(f"{self.name}_bucket{_format_labels(bucket_labels)} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = []
+
+    def _register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help):
+        return self._register(Counter(name, help))
+
+    def gauge(self, name, help, function):
+        return self._register(Gauge(name, help, function))
+
+    def histogram(self, name, help, **kwargs):
+        return self._register(Histogram(name, help, **kwargs))
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
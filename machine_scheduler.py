@@ -0,0 +1,159 @@
+import asyncio
+import math
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Shortest tick interval accepted, in seconds
+MIN_INTERVAL = 0.001
+
+
+def check_interval(interval):
+    """`interval` as a float; raises ValueError unless it is finite and at least MIN_INTERVAL."""
+    interval = float(interval)
+    if not math.isfinite(interval) or interval < MIN_INTERVAL:
+        raise ValueError(f"interval must be a finite number of seconds, at least {MIN_INTERVAL}")
+    return interval
+
+
+class TickScheduler:
+    """Fixed-timestep tick loop on absolute deadlines.
+
+    Tick n is due at start + n * interval, so a slow tick delays the next one but
+    never shifts the schedule. After an overrun the missed ticks run back to back,
+    up to `max_catch_up` of them; anything further behind is dropped, so a long
+    stall does not turn into a burst of ticks.
+
+    Subsystems can run at lower rates: `periods` maps a subsystem name to the
+    number of ticks between its runs (1, the default, is every tick).
+    """
+
+    def __init__(self, subsystems, interval=0.3, max_catch_up=3, periods=None,
+                 rate_window=100, drift=None, overruns=None):
+        self.subsystems = tuple(subsystems)
+        self.interval = check_interval(interval)
+        self.max_catch_up = max_catch_up
+        self.periods = {}
+        self.set_periods(periods or {})
+        self.tick_count = 0
+        self.dropped_ticks = 0
+        self.running = False
+        # Optional histogram and counter the scheduler reports into
+        self.drift = drift
+        self.overruns = overruns
+        self._tick_times = deque(maxlen=rate_window)
+        self._wakeup = threading.Event()
+        self._last_deadline = None
+
+    def set_interval(self, interval):
+        """Change the tick interval; takes effect from the next tick."""
+        self.interval = check_interval(interval)
+        self._tick_times.clear()
+        self._wakeup.set()
+
+    def check_periods(self, periods):
+        """`periods` with every period as an int; raises ValueError if any entry is invalid."""
+        checked = {}
+        for name, period in periods.items():
+            if name not in self.subsystems:
+                raise ValueError(f"Unknown subsystem {name}")
+            try:
+                period = int(period)
+            except (TypeError, ValueError, OverflowError):
+                raise ValueError(f"Period of {name} must be a whole number of ticks")
+            if period < 1:
+                raise ValueError(f"Period of {name} must be at least 1 tick")
+            checked[name] = period
+        return checked
+
+    def set_periods(self, periods):
+        """Change subsystem periods; nothing changes unless every entry is valid."""
+        self.periods.update(self.check_periods(periods))
+
+    def due(self, tick):
+        """Subsystems that run in tick number `tick`."""
+        return [name for name in self.subsystems if tick % self.periods.get(name, 1) == 0]
+
+    @property
+    def tick_rate(self):
+        """Achieved ticks per second over the recent window."""
+        if len(self._tick_times) < 2:
+            return 0.0
+        span = self._tick_times[-1] - self._tick_times[0]
+        return (len(self._tick_times) - 1) / span if span > 0 else 0.0
+
+    def stats(self):
+        return {
+            "interval": self.interval,
+            "target_rate": 1 / self.interval,
+            "tick_rate": self.tick_rate,
+            "tick_count": self.tick_count,
+            "dropped_ticks": self.dropped_ticks,
+            "max_catch_up": self.max_catch_up,
+            "periods": {name: self.periods.get(name, 1) for name in self.subsystems},
+        }
+
+    def _start(self):
+        self.running = True
+        self._last_deadline = time.perf_counter() - self.interval
+
+    def _time_to_next(self):
+        # Recomputed every time, so a new interval applies to the very next tick
+        return self._last_deadline + self.interval - time.perf_counter()
+
+    def _begin_tick(self):
+        """Deadline bookkeeping before a tick; returns (start time, deadline)."""
+        now = time.perf_counter()
+        deadline = self._last_deadline + self.interval
+        behind = int((now - deadline) / self.interval)
+        if behind > self.max_catch_up:
+            dropped = behind - self.max_catch_up
+            deadline += dropped * self.interval
+            self.dropped_ticks += dropped
+        if self.drift is not None:
+            self.drift.observe(now - deadline)
+        return now, deadline
+
+    def _end_tick(self, now, deadline):
+        elapsed = time.perf_counter() - now
+        if elapsed > self.interval and self.overruns is not None:
+            self.overruns.inc()
+        self.tick_count += 1
+        self._tick_times.append(now)
+        self._last_deadline = deadline
+
+    def run(self, tick):
+        """Call tick(subsystems) on schedule until stop() is called."""
+        self._start()
+        while self.running:
+            wait = self._time_to_next()
+            if wait > 0:
+                self._wakeup.wait(wait)
+                self._wakeup.clear()
+                continue
+            now, deadline = self._begin_tick()
+            tick(self.due(self.tick_count))
+            self._end_tick(now, deadline)
+
+    async def run_async(self, tick):
+        """Same as run(), as a task on an asyncio event loop.
+
+        The ticks themselves run on a thread of their own, so a tick waiting for
+        a lock never blocks the event loop.
+        """
+        self._start()
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="tick") as executor:
+            while self.running:
+                wait = self._time_to_next()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                    continue
+                now, deadline = self._begin_tick()
+                await loop.run_in_executor(executor, tick, self.due(self.tick_count))
+                self._end_tick(now, deadline)
+
+    def stop(self):
+        self.running = False
+        self._wakeup.set()
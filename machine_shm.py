@@ -0,0 +1,378 @@
+"""Multi-process serving: the simulator publishes into shared memory, API workers read it.
+
+    MACHINE_API_WORKERS=4 python machine_simulator.py
+
+The simulator process keeps ticking as usual and, with every new version, writes
+the state into a shared-memory segment laid out from the engine's key index.
+The worker processes share one listening socket. They answer /api/status,
+/api/schema and /api/stream straight from that segment, so reads never touch
+the simulator's interpreter or lock. Every other request (updates, history,
+checkpoints, ...) is sent to the simulator process over a queue, answered by
+its Flask app there, and the response is sent back.
+
+Segment layout (native byte order):
+
+    header   6 x uint64: sequence, version, cycle count, layout generation,
+             key count, metadata length
+    metadata JSON with keys, kinds, epoch and extras, rewritten only when
+             they change (the generation counts the rewrites)
+    state    float64 per key, as in StepEngine.state[0]
+    changed  int64 per key, the version each key last changed in
+
+Consistency comes from a seqlock: the writer makes the sequence odd, writes,
+then makes it even again; a reader copies what it needs and retries if the
+sequence was odd or moved in between. Nothing here issues memory barriers: the
+protocol relies on x86 making stores visible to other cores in program order,
+so start_workers() refuses to run on any other architecture. A reader that
+cannot get a consistent copy within READ_TIMEOUT (say, because the simulator
+died half-way through a write) gives up with TimeoutError, answered as 503.
+"""
+import itertools
+import json
+import os
+import platform
+import socket
+import threading
+import time
+import multiprocessing
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import shared_memory
+from flask import Flask, Response, jsonify, request
+from werkzeug.serving import make_server
+from werkzeug.test import EnvironBuilder, run_wsgi_app
+from machine_engine import _CASTERS
+from machine_encoding import KeyIndex, encode_status
+from machine_snapshot import StatusSnapshot
+
+_HEADER_WORDS = 6
+_HEADER_BYTES = 64
+_KINDS = {bool: "bool", int: "int", float: "float"}
+_KIND_NAMES = {name: kind for kind, name in _KINDS.items()}
+# How often a worker's event stream looks for a new version, in seconds
+STREAM_POLL_INTERVAL = 0.05
+KEEPALIVE_SECONDS = 15
+FORWARD_TIMEOUT = 10.0
+# Longest a reader retries for a consistent copy of the segment, in seconds
+READ_TIMEOUT = 1.0
+# platform.machine() values with the store ordering the seqlock needs
+SEQLOCK_MACHINES = {"x86_64", "amd64", "i386", "i686", "x86"}
+
+
+class SharedState:
+    """The shared-memory segment, written by the simulator and read by the workers.
+
+    `capacity` bounds the number of keys and `meta_capacity` the metadata bytes,
+    with room to spare for structure reloads that add units.
+    """
+
+    def __init__(self, capacity, meta_capacity):
+        self.capacity = capacity
+        self.meta_capacity = meta_capacity
+        size = _HEADER_BYTES + meta_capacity + capacity * 16
+        self.memory = shared_memory.SharedMemory(create=True, size=size)
+        self._map()
+        self._header[:] = 0
+        # Writer side
+        self._keys = None
+        self._extras = None
+        self._extra_changed_at = None
+        self._overflow = False
+        # Reader side; the lock keeps request threads from rebuilding the snapshot together
+        self._read_lock = threading.Lock()
+        self._read_sequence = None
+        self._read_generation = None
+        self._layout = None
+        self._snapshot = None
+
+    def _map(self):
+        buf = self.memory.buf
+        self._header = np.ndarray(_HEADER_WORDS, dtype=np.uint64, buffer=buf)
+        self._meta = np.ndarray(self.meta_capacity, dtype=np.uint8, buffer=buf, offset=_HEADER_BYTES)
+        offset = _HEADER_BYTES + self.meta_capacity
+        self._state = np.ndarray(self.capacity, dtype=np.float64, buffer=buf, offset=offset)
+        self._changed_at = np.ndarray(self.capacity, dtype=np.int64, buffer=buf, offset=offset + self.capacity * 8)
+
+    @classmethod
+    def for_simulator(cls, simulator):
+        keys = len(simulator.engine.keys)
+        return cls(capacity=4 * keys + 1024, meta_capacity=max(1 << 20, keys * 256))
+
+    def close(self):
+        self._header = self._meta = self._state = self._changed_at = None
+        self.memory.close()
+
+    def unlink(self):
+        self.memory.unlink()
+
+    # --- Writer ---
+
+    def publish(self, simulator):
+        """Write the simulator's current state; called with its lock held, after every new version."""
+        engine = simulator.engine
+        count = len(engine.keys)
+        extras = engine.extras[0]
+        meta = None
+        if engine.keys is not self._keys or extras != self._extras \
+                or simulator._extra_changed_at != self._extra_changed_at:
+            meta = json.dumps({
+                "epoch": simulator.epoch,
+                "keys": engine.keys,
+                "kinds": [_KINDS[kind] for kind in engine.kinds],
+                "extras": extras,
+                "extra_changed_at": simulator._extra_changed_at,
+            }, separators=(',', ':')).encode()
+            if count > self.capacity or len(meta) > self.meta_capacity:
+                if not self._overflow:
+                    print("Shared state segment too small for the new structure; restart the server to resize it.")
+                    self._overflow = True
+                return
+            self._keys = engine.keys
+            self._extras = dict(extras)
+            self._extra_changed_at = dict(simulator._extra_changed_at)
+
+        header = self._header
+        header[0] += 1
+        if meta is not None:
+            self._meta[:len(meta)] = np.frombuffer(meta, dtype=np.uint8)
+            header[3] += 1
+            header[4] = count
+            header[5] = len(meta)
+        self._state[:count] = engine.state[0]
+        self._changed_at[:count] = simulator._changed_at
+        header[1] = simulator.version
+        header[2] = simulator.cycle_count
+        header[0] += 1
+
+    # --- Reader ---
+
+    def snapshot(self):
+        """Latest published state as a StatusSnapshot, rebuilt only when the sequence moved."""
+        header = self._header
+        if int(header[0]) == self._read_sequence:
+            return self._snapshot
+        with self._read_lock:
+            return self._read_snapshot()
+
+    def _read_snapshot(self):
+        header = self._header
+        deadline = time.monotonic() + READ_TIMEOUT
+        while True:
+            if time.monotonic() > deadline:
+                raise TimeoutError("No consistent state in shared memory; the simulator may have stopped")
+            sequence = int(header[0])
+            if sequence & 1:
+                time.sleep(0)
+                continue
+            version, cycle_count, generation, count, meta_length = (int(word) for word in header[1:])
+            meta = self._meta[:meta_length].tobytes() if generation != self._read_generation else None
+            state = self._state[:count].copy()
+            changed_at = self._changed_at[:count].copy()
+            if int(header[0]) == sequence:
+                break
+
+        if meta is not None:
+            layout = json.loads(meta)
+            casters = [_CASTERS[_KIND_NAMES[kind]] for kind in layout["kinds"]]
+            self._layout = (layout, casters, KeyIndex(layout["keys"] + list(layout["extras"])))
+            self._read_generation = generation
+        layout, casters, index = self._layout
+        keys = layout["keys"]
+        variables = {key: cast(value) for key, cast, value in zip(keys, casters, state.tolist())}
+        variables.update(layout["extras"])
+        self._snapshot = StatusSnapshot(layout["epoch"], version, cycle_count, variables, keys,
+                                        changed_at, layout["extra_changed_at"], index)
+        self._read_sequence = sequence
+        return self._snapshot
+
+
+# --- Requests forwarded from the workers to the simulator process ---
+
+def serve_forwarded(app, requests, replies, threads=16):
+    """Answer requests forwarded by the workers with the simulator's WSGI app, until None arrives.
+
+    Several run at once, since an update waits for the next tick before it answers.
+    """
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        while True:
+            item = requests.get()
+            if item is None:
+                return
+            executor.submit(_answer, app, replies, item)
+
+
+def _answer(app, replies, item):
+    worker_id, request_id, method, path, query, headers, body = item
+    try:
+        environ = EnvironBuilder(path=path, method=method, query_string=query,
+                                 headers=headers, data=body).get_environ()
+        app_iter, status, response_headers = run_wsgi_app(app, environ, buffered=True)
+        reply = (request_id, int(status.split(" ", 1)[0]), list(response_headers.items()), b"".join(app_iter))
+    except Exception as e:
+        print(f"Error answering forwarded request {method} {path}: {e}")
+        reply = (request_id, 500, [("Content-Type", "application/json")],
+                 json.dumps({"error": "Internal error"}).encode())
+    replies[worker_id].put(reply)
+
+
+class Forwarder:
+    """Worker side of the forwarding: sends requests and hands each reply to the thread waiting for it."""
+
+    def __init__(self, worker_id, requests, replies):
+        self.worker_id = worker_id
+        self.requests = requests
+        self.replies = replies
+        self._ids = itertools.count()
+        self._pending = {}
+        self._lock = threading.Lock()
+        threading.Thread(target=self._dispatch, daemon=True).start()
+
+    def _dispatch(self):
+        while True:
+            reply = self.replies.get()
+            with self._lock:
+                waiting = self._pending.pop(reply[0], None)
+            if waiting is not None:
+                waiting[1].append(reply)
+                waiting[0].set()
+
+    def forward(self, method, path, query, headers, body, timeout=FORWARD_TIMEOUT):
+        """Returns (status, headers, body), or None if the simulator process did not answer in time."""
+        request_id = next(self._ids)
+        done, result = threading.Event(), []
+        with self._lock:
+            self._pending[request_id] = (done, result)
+        self.requests.put((self.worker_id, request_id, method, path, query, headers, body))
+        if not done.wait(timeout):
+            with self._lock:
+                self._pending.pop(request_id, None)
+            return None
+        return result[0][1:]
+
+
+# --- Workers ---
+
+def create_worker_app(shared, forwarder):
+    app = Flask(__name__)
+
+    @app.after_request
+    def allow_any_origin(response):
+        response.headers.setdefault('Access-Control-Allow-Origin', '*')
+        return response
+
+    @app.errorhandler(TimeoutError)
+    def state_unavailable(e):
+        return jsonify({"error": str(e)}), 503
+
+    @app.route('/api/status', methods=['GET'])
+    def get_status():
+        try:
+            encoded = encode_status(shared.snapshot(), request.args, request.headers.get('Accept', ''),
+                                    request.headers.get('Accept-Encoding', ''))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        if encoded.etag is None:
+            return Response(encoded.body, content_type=encoded.content_type, headers=encoded.headers())
+        if request.if_none_match.contains(encoded.etag):
+            response = Response(status=304)
+        else:
+            response = Response(encoded.body, content_type=encoded.content_type, headers=encoded.headers())
+        response.set_etag(encoded.etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    @app.route('/api/schema', methods=['GET'])
+    def get_schema():
+        index = shared.snapshot().index
+        keys = index.select(request.args['keys'])[0] if request.args.get('keys') else index.keys
+        return jsonify({"schema": index.schema, "keys": keys})
+
+    @app.route('/api/stream', methods=['GET'])
+    def stream_status():
+        try:
+            since = int(request.args.get('since', request.headers.get('Last-Event-ID', 0)))
+        except ValueError:
+            return jsonify({"error": "since must be an integer version"}), 400
+
+        def events(since):
+            if since > shared.snapshot().version:
+                since = 0
+            last_event = time.monotonic()
+            while True:
+                try:
+                    snapshot = shared.snapshot()
+                except TimeoutError:
+                    return
+                version, changes = snapshot.changes_since(since)
+                if version != since:
+                    data = {'epoch': snapshot.epoch, 'version': version, 'changes': changes}
+                    yield f"id: {version}\ndata: {json.dumps(data)}\n\n"
+                    since = version
+                    last_event = time.monotonic()
+                elif time.monotonic() - last_event > KEEPALIVE_SECONDS:
+                    yield ": keepalive\n\n"
+                    last_event = time.monotonic()
+                time.sleep(STREAM_POLL_INTERVAL)
+
+        return Response(events(since), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+    @app.route('/', defaults={'path': ''}, methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'])
+    @app.route('/<path:path>', methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'])
+    def forward(path):
+        headers = [(name, value) for name, value in request.headers.items() if name.lower() != 'content-length']
+        reply = forwarder.forward(request.method, request.path, request.query_string.decode('latin-1'),
+                                  headers, request.get_data())
+        if reply is None:
+            return jsonify({"error": "Simulator did not answer in time"}), 504
+        status, headers, body = reply
+        headers = [(name, value) for name, value in headers if name.lower() != 'content-length']
+        return Response(body, status=status, headers=headers)
+
+    return app
+
+
+def _exit_with_parent(parent_pid):
+    # A worker left behind would keep serving a state that no longer changes
+    while os.getppid() == parent_pid:
+        time.sleep(1)
+    os._exit(0)
+
+
+def run_worker(worker_id, shared, listener, requests, replies, parent_pid):
+    threading.Thread(target=_exit_with_parent, args=(parent_pid,), daemon=True).start()
+    forwarder = Forwarder(worker_id, requests, replies)
+    server = make_server(*listener.getsockname()[:2], create_worker_app(shared, forwarder),
+                         threaded=True, fd=listener.fileno())
+    print(f"API worker {worker_id} (pid {os.getpid()}) serving.")
+    server.serve_forever()
+
+
+def start_workers(simulator, app, workers, host="0.0.0.0", port=5000):
+    """Publish the simulator into shared memory and start `workers` API processes on host:port.
+
+    Call this before starting any other thread, since the workers are forked.
+    Returns the worker processes. Raises RuntimeError on platforms the seqlock
+    is not safe on.
+    """
+    if platform.machine().lower() not in SEQLOCK_MACHINES:
+        raise RuntimeError(f"API workers need an x86 CPU; this is {platform.machine() or 'unknown'}. "
+                           "Run without MACHINE_API_WORKERS.")
+    shared = SharedState.for_simulator(simulator)
+    with simulator.lock:
+        simulator.shared_state = shared
+        shared.publish(simulator)
+
+    listener = socket.create_server((host, port), backlog=128)
+    context = multiprocessing.get_context("fork")
+    requests = context.Queue()
+    replies = [context.Queue() for _ in range(workers)]
+    processes = [
+        context.Process(target=run_worker, args=(i, shared, listener, requests, replies[i], os.getpid()),
+                        daemon=True)
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    threading.Thread(target=serve_forwarded, args=(app, requests, replies), daemon=True).start()
+    print(f"Serving the API from {workers} worker processes on {host}:{port}.")
+    return processes
@@ -1,103 +1,345 @@
 import time
 import threading
-import random
+import hashlib
 import json
 import os
-from flask import Flask, jsonify, request
+import signal
+import numpy as np
+from flask import Flask, Response, g, jsonify, request
 from flask_cors import CORS
 from typing import Dict, List, Any
+from machine_engine import StepEngine, VariableView
+from machine_fleet import MachineFleet
+from machine_snapshot import StatusSnapshot, encode_json
+from machine_fastforward import fast_forward
+from machine_history import HistoryBuffer
+from machine_ticklog import TickLog, TickLogWriter
+from machine_commands import CommandQueue
+from machine_metrics import MetricsRegistry
+from machine_scheduler import TickScheduler, check_interval
+from machine_checkpoint import Checkpoint
+from machine_structure import StructureFile
+from machine_encoding import KeyIndex, encode_status
+from machine_shm import start_workers
 
-class MachineSimulator:
-    def __init__(self):
-        # Load the machine structure from JSON file
+# How often the structure files are checked for changes, in seconds
+STRUCTURE_CHECK_INTERVAL = 1.0
+
+# Initial values of the machine state variables; units that are only in the
+# structure files start from the per-type defaults of the step engine
+INITIAL_VARIABLES = {
+    # Chemical components
+    "chemical1.value": 75,
+    "chemical1.purity": 95,
+    "chemical1.active": True,
+    "chemical1.output": 50,
+    "chemical2.value": 60,
+    "chemical2.purity": 90,
+    "chemical2.active": True,
+    "chemical2.output": 50,
+    "chemical3.value": 45,
+    "chemical3.purity": 85,
+    "chemical3.active": True,
+    "chemical3.output": 50,
+    "mixer.active": True,
+    "mixer.max_throughput": 200,
+    "mixer.mixture_quality": 0,
+
+    # Generator components
+    "generator1.value": 5,
+    "generator1.temp": 20.1,
+    "generator1.active": True,
+    "generator2.value": 6,
+    "generator2.temp": 20.1,
+    "generator2.active": True,
+    "generator3.value": 4,
+    "generator3.temp": 19.9,
+    "generator3.active": True,
+
+    # Battery components
+    "akku1.capacity": 10000,
+    "akku1.value": 0,
+    "akku1.active": True,
+    "akku2.capacity": 10000,
+    "akku2.value": 0,
+    "akku2.active": True,
+    "akku3.capacity": 10000,
+    "akku3.value": 0,
+    "akku3.active": True,
+
+    # Other components
+    "aggregator.value": 0,
+    "aggregator.active": True,
+    "producer.consumption": 20,
+    "producer.output": 0,
+    "producer.active": True,
+    "productCounter.value": 0,
+    "room.temp": 20.0,
+
+    # Gauge components
+    "pressure-gauge.value": 75,
+    "pressure-gauge.active": True,
+    "temperature-gauge.value": 65,
+    "temperature-gauge.active": True,
+    "flow-gauge.value": 42,
+    "flow-gauge.active": True,
+
+    # Slider components
+    "power-slider.value": 65,
+    "power-slider.active": True,
+    "flow-slider.value": 50,
+    "flow-slider.active": True,
+    "pressure-slider.value": 70,
+    "pressure-slider.active": True
+}
+
+def prepare_updates(engine, variables, data):
+    """MachineSimulator.prepare_updates for any engine and its VariableView."""
+    index = engine.index
+    coercers = engine.coercers
+    values = {}
+    rejected = []
+    for key, value in data.items():
+        i = index.get(key)
         try:
-            json_file_path = os.path.join(os.path.dirname(__file__), 'machine1.json')
-            with open(json_file_path, 'r') as f:
-                self.machine_structure = json.load(f)
-            print(f"Successfully loaded machine structure from {json_file_path}")
-        except Exception as e:
-            print(f"Error loading machine structure from JSON: {e}")
-            # Fallback to empty structure
-            self.machine_structure = {
-                "components": [],
-                "layout": {"grid": {"columns": {"sm": 3, "md": 4, "lg": 5, "xl": 6}}},
-                "connections": []
-            }
+            if i is not None:
+                value = coercers[i](value)
+            elif key in variables:
+                value = variables.coerce(key, value)
+            else:
+                print(f"Error: Unknown variable '{key}'")
+                rejected.append(key)
+                continue
+        except (TypeError, ValueError):
+            print(f"Error: Could not convert value '{value}' for key '{key}' to {variables.kind(key)}")
+            rejected.append(key)
+            continue
+        values[key] = value
+        # An inactive generator stops producing immediately
+        if i is not None and not value and key.endswith(".active") \
+                and engine.component_type(key) == "generator":
+            values[key.replace(".active", ".value")] = 0
+    return values, rejected
+
+
+class SimulatorBranch:
+    """Stopped what-if copy of a MachineSimulator, see MachineSimulator.fork().
+
+    Only the engine state, the cycle count and a random source: no history,
+    metrics, scheduler or published snapshots, so a fork costs little more than
+    a copy of the state row. fast_forward() works on it like on the simulator.
+    """
+
+    def __init__(self, engine, cycle_count):
+        self.engine = engine
+        self.rng = engine.rng
+        self.variables = VariableView(engine)
+        self.cycle_count = cycle_count
+        self.lock = threading.Lock()
+
+    def prepare_updates(self, data):
+        return prepare_updates(self.engine, self.variables, data)
+
+    def status_dict(self):
+        with self.lock:
+            return self.variables.copy()
+
+    def _record_changes(self, extra_keys=()):
+        # Called by fast_forward(); a branch publishes nothing
+        pass
+
+
+class MachineSimulator:
+    def __init__(self, seed=None, tick_interval=0.3, structures=None):
+        if structures is None:
+            # Load the machine structure from JSON file; edits to the files are picked up while running
+            self.structure_files = (
+                StructureFile('machine1.json', {
+                    "components": [],
+                    "layout": {"grid": {"columns": {"sm": 3, "md": 4, "lg": 5, "xl": 6}}},
+                    "connections": []
+                }),
+                # The chemical/mixer section of the plant lives in the labor structure
+                StructureFile('labor.json', {"components": [], "connections": []}),
+            )
+            machine_structure, labor_structure = (f.structure for f in self.structure_files)
+        else:
+            self.structure_files = None
+            machine_structure, labor_structure = structures
+        self._next_structure_check = time.monotonic() + STRUCTURE_CHECK_INTERVAL
         
-        # Initialize the machine state variables
-        self.variables = {
-            # Chemical components
-            "chemical1.value": 75,
-            "chemical1.purity": 95,
-            "chemical1.active": True,
-            "chemical1.output": 50,
-            "chemical2.value": 60,
-            "chemical2.purity": 90,
-            "chemical2.active": True,
-            "chemical2.output": 50,
-            "chemical3.value": 45,
-            "chemical3.purity": 85,
-            "chemical3.active": True,
-            "chemical3.output": 50,
-            "mixer.active": True,
-            "mixer.max_throughput": 200,
-            "mixer.mixture_quality": 0,
-            
-            # Generator components
-            "generator1.value": 5,
-            "generator1.temp": 20.1,
-            "generator1.active": True,
-            "generator2.value": 6,
-            "generator2.temp": 20.1,
-            "generator2.active": True,
-            "generator3.value": 4,
-            "generator3.temp": 19.9,
-            "generator3.active": True,
-            
-            # Battery components
-            "akku1.capacity": 10000,
-            "akku1.value": 0,
-            "akku1.active": True,
-            "akku2.capacity": 10000,
-            "akku2.value": 0,
-            "akku2.active": True,
-            "akku3.capacity": 10000,
-            "akku3.value": 0,
-            "akku3.active": True,
-            
-            # Other components
-            "aggregator.value": 0,
-            "aggregator.active": True,
-            "producer.consumption": 20,
-            "producer.output": 0,
-            "producer.active": True,
-            "productCounter.value": 0,
-            "room.temp": 20.0,
-            
-            # Gauge components
-            "pressure-gauge.value": 75,
-            "pressure-gauge.active": True,
-            "temperature-gauge.value": 65,
-            "temperature-gauge.active": True,
-            "flow-gauge.value": 42,
-            "flow-gauge.active": True,
-            
-            # Slider components
-            "power-slider.value": 65,
-            "power-slider.active": True,
-            "flow-slider.value": 50,
-            "flow-slider.active": True,
-            "pressure-slider.value": 70,
-            "pressure-slider.active": True
-        }
+        # Per-simulator random source, so a seeded simulator always replays the same run
+        self.rng = np.random.default_rng(seed)
         self.cycle_count = 0
         self.running = False
         self.lock = threading.Lock() # Lock for thread-safe access to variables
 
+        # State version, bumped by every tick and update. Each variable remembers the
+        # version it last changed in, so clients can fetch only what changed since
+        # the version they already have. Everything counts as changed in version 1.
+        self.version = 1
+        self.version_changed = threading.Condition()
+        # API writes wait here and are applied together at the next tick boundary
+        self.commands = CommandQueue()
+        # Optional TickLogWriter recording every tick, see enable_tick_log
+        self.tick_log = None
+        self._build_engine(machine_structure, labor_structure, INITIAL_VARIABLES)
+
+        self._register_metrics()
+        # Paces the simulation loop; subsystems can be given lower rates through its periods
+        self.scheduler = TickScheduler(
+            self.engine.SUBSYSTEMS, interval=tick_interval,
+            drift=self.tick_drift_seconds, overruns=self.tick_overruns,
+        )
+        self.metrics.gauge("machine_tick_target_rate", "Ticks per second the scheduler aims for",
+                           lambda: 1 / self.scheduler.interval)
+        self.metrics.gauge("machine_tick_rate", "Ticks per second achieved recently",
+                           lambda: self.scheduler.tick_rate)
+        self.metrics.gauge("machine_dropped_ticks", "Ticks skipped because the loop fell too far behind",
+                           lambda: self.scheduler.dropped_ticks)
+
+        # Latest published state; readers use it without taking self.lock
+        self.epoch = os.urandom(4).hex()
+        # Optional machine_shm.SharedState every version is also written to
+        self.shared_state = None
+        self._publish_snapshot()
+
+    def _build_engine(self, machine_structure, labor_structure, initial=None, engine=None):
+        """Build the engine (unless given) and everything sized by its keys from the structure files.
+
+        Every variable counts as changed in the current version. Must be called with
+        self.lock held (or from __init__).
+        """
+        # Built first, so a structure the engine rejects leaves everything as it was
+        engine = engine or StepEngine.from_structures(
+            [machine_structure, labor_structure], initial=initial, rng=self.rng
+        )
+        self.machine_structure = machine_structure
+        self.labor_structure = labor_structure
+        # /api/structure serves these bytes as they are; the ETag is a hash of the content
+        self.structure_body = encode_json(machine_structure)
+        self.structure_etag = hashlib.sha1(self.structure_body).hexdigest()[:16]
+        self.engine = engine
+        self.variables = VariableView(self.engine)
+        # Rebuilt on the next publish, see _publish_snapshot
+        self.key_index = None
+        self._changed_at = np.full(len(self.engine.keys), self.version, dtype=np.int64)
+        self._extra_changed_at = {key: self.version for key in self.engine.extras[0]}
+        self._previous_state = self.engine.state[0].copy()
+        # Bounded history of every structural variable, sampled with each version
+        self.history = HistoryBuffer(self.engine.keys)
+
+    def _replace_structures(self, machine_structure, labor_structure, engine=None):
+        """Rebuild the engine for new structures, keeping the values of every key both share.
+
+        History and the tick log continue if the set of keys stayed the same. Must be
+        called with self.lock held; the caller records the changes.
+        """
+        old_engine, history = self.engine, self.history
+        self._build_engine(machine_structure, labor_structure, engine=engine)
+        common = [(i, old_engine.index[key]) for i, key in enumerate(self.engine.keys) if key in old_engine.index]
+        if common:
+            new_columns, old_columns = zip(*common)
+            self.engine.state[0, list(new_columns)] = old_engine.state[0, list(old_columns)]
+        self.engine.extras[0].update(old_engine.extras[0])
+        self._extra_changed_at = {key: self.version for key in self.engine.extras[0]}
+        self._changed_at[:] = self.version + 1
+        if self.engine.keys == old_engine.keys:
+            self.history = history
+        elif self.tick_log is not None:
+            print("Variables changed with the structure; tick logging stopped.")
+            self.tick_log.close()
+            self.tick_log = None
+
+    def check_structures(self):
+        """Reload the structure files if they changed on disk, at most once per STRUCTURE_CHECK_INTERVAL.
+
+        Returns True if the structure was reloaded.
+        """
+        now = time.monotonic()
+        if self.structure_files is None or now < self._next_structure_check:
+            return False
+        self._next_structure_check = now + STRUCTURE_CHECK_INTERVAL
+        if not any(f.changed() for f in self.structure_files):
+            return False
+        with self.lock:
+            # Both files are reloaded, so neither is left with a pending change
+            if not any([f.reload() for f in self.structure_files]):
+                return False
+            machine_structure, labor_structure = (f.structure for f in self.structure_files)
+            try:
+                engine = StepEngine.from_structures([machine_structure, labor_structure], rng=self.rng)
+            except Exception as e:
+                print(f"Error building engine from reloaded structure, keeping the current one: {e}")
+                return False
+            self._replace_structures(machine_structure, labor_structure, engine=engine)
+            self._record_changes(list(self.engine.extras[0]))
+        print(f"Structure reloaded: {len(self.engine.keys)} variables.")
+        return True
+
+    def _register_metrics(self):
+        self.metrics = MetricsRegistry()
+        self.tick_seconds = self.metrics.histogram(
+            "machine_tick_duration_seconds", "Duration of update_components, including the lock wait")
+        self.lock_wait_seconds = self.metrics.histogram(
+            "machine_lock_wait_seconds", "Time the tick waited for the simulator lock")
+        self.lock_hold_seconds = self.metrics.histogram(
+            "machine_lock_hold_seconds", "Time the tick held the simulator lock")
+        self.tick_drift_seconds = self.metrics.histogram(
+            "machine_tick_drift_seconds", "How late each tick started compared to its schedule")
+        self.tick_overruns = self.metrics.counter(
+            "machine_tick_overruns_total", "Ticks that took longer than the tick interval")
+        self.updates_applied = self.metrics.counter(
+            "machine_updates_applied_total", "Variable writes applied after coalescing")
+        self.update_batches = self.metrics.counter(
+            "machine_update_batches_total", "Update requests applied")
+        self.metrics.gauge("machine_update_queue_depth", "Update requests waiting for the next tick",
+                           lambda: len(self.commands))
+        self.metrics.gauge("machine_cycle_count", "Simulation ticks run", lambda: self.cycle_count)
+        self.metrics.gauge("machine_state_version", "Current state version", lambda: self.version)
+
     def status_dict(self):
         with self.lock:
             return self.variables.copy()
 
+    def _record_changes(self, extra_keys=()):
+        """Start a new version, stamp every variable that changed with it and publish it.
+
+        Must be called with self.lock held.
+        """
+        self.version += 1
+        current = self.engine.state[0]
+        self._changed_at[current != self._previous_state] = self.version
+        self._previous_state[:] = current
+        for key in extra_keys:
+            self._extra_changed_at[key] = self.version
+        self.history.record(time.time(), current)
+        self._publish_snapshot()
+        with self.version_changed:
+            self.version_changed.notify_all()
+
+    def _publish_snapshot(self):
+        variables = self.variables.copy()
+        if self.key_index is None or len(self.key_index.keys) != len(variables):
+            self.key_index = KeyIndex(variables)
+        # Replacing the attribute is atomic, so readers see either the old or the new snapshot
+        self.snapshot = StatusSnapshot(
+            self.epoch, self.version, self.cycle_count, variables,
+            self.engine.keys, self._changed_at.copy(), dict(self._extra_changed_at), self.key_index,
+        )
+        if self.shared_state is not None:
+            self.shared_state.publish(self)
+
+    def changes_since(self, since):
+        """Return (version, changes) with the variables changed after version `since`."""
+        return self.snapshot.changes_since(since)
+
+    def wait_for_version(self, version, timeout=None):
+        """Block until the state is newer than `version` (or timeout); returns the current version."""
+        with self.version_changed:
+            self.version_changed.wait_for(lambda: self.version > version, timeout)
+        return self.version
+
     def print_status(self): # Renamed from status to avoid conflict
         print("--- Machine Status ---")
         current_vars = self.status_dict()
@@ -109,274 +351,209 @@ class MachineSimulator:
         sys.stdout.flush()
 
     def update_variable(self, key, value):
+        """Set a single variable through the command queue; returns True if it was accepted."""
+        # Special handling for system.debug; print_status takes the lock itself
+        if key == "system.debug" and value:
+            self.print_status()
+            return True
+        batch, rejected = self.submit_updates({key: value})
+        return batch is not None
+
+    def prepare_updates(self, data):
+        """Convert a dict of API writes to the variables' types; returns (values, rejected keys).
+
+        Unknown keys are rejected. Deactivating a generator also sets its value to 0.
+        """
+        return prepare_updates(self.engine, self.variables, data)
+
+    def queue_updates(self, data):
+        """Queue a dict of API writes for the next tick without waiting for it.
+
+        Returns (batch, rejected keys); the batch is None if no value was valid.
+        """
+        values, rejected = self.prepare_updates(data)
+        if not values:
+            return None, rejected
+        batch = self.commands.submit(values)
+        if not self.running:
+            # No simulation loop is going to drain the queue
+            with self.lock:
+                self._apply_updates()
+        return batch, rejected
+
+    def submit_updates(self, data, timeout=1.0):
+        """Queue a dict of API writes for the next tick and wait until they are applied.
+
+        Returns (batch, rejected keys). The batch is None if no value was valid; its
+        `version` is None if the tick did not apply it within `timeout`.
+        """
+        batch, rejected = self.queue_updates(data)
+        if batch is not None:
+            batch.wait(timeout)
+        return batch, rejected
+
+    def _apply_updates(self):
+        """Apply every queued write as one new version, last write per key winning.
+
+        Must be called with self.lock held.
+        """
+        batches, values = self.commands.drain()
+        if not batches:
+            return
+        extra_keys = []
+        for key, value in values.items():
+            if key not in self.engine.index:
+                extra_keys.append(key)
+            self.variables[key] = value
+        self.updates_applied.inc(len(values))
+        self.update_batches.inc(len(batches))
+        self._record_changes(extra_keys)
+        for batch in batches:
+            batch.version = self.version
+            batch.applied.set()
+
+    def update_components(self, subsystems=None):
+        self.check_structures()
+        wait_start = time.perf_counter()
         with self.lock:
-            # Special handling for system.debug
-            if key == "system.debug" and value:
-                self.print_status()
-                return True
-                
-            if key in self.variables:
-                # Store the old value for logging before making any changes
-                old_value = self.variables[key]
-                
-                # Type conversion for values coming from frontend (usually strings)
-                current_type = type(self.variables[key])
+            hold_start = time.perf_counter()
+            self._apply_updates()
+            self.engine.step(subsystems)
+            self.cycle_count += 1
+            self._record_changes()
+            if self.tick_log is not None:
+                self.tick_log.append(self.cycle_count, time.time(), self.engine.state[0])
+        hold_end = time.perf_counter()
+        self.lock_wait_seconds.observe(hold_start - wait_start)
+        self.lock_hold_seconds.observe(hold_end - hold_start)
+        self.tick_seconds.observe(hold_end - wait_start)
+
+    def checkpoint(self):
+        """Capture the current state as a Checkpoint (see machine_checkpoint.py)."""
+        with self.lock:
+            return Checkpoint(
+                self.engine.state[0].copy(), dict(self.engine.extras[0]), self.cycle_count,
+                self.rng.bit_generator.state, [self.machine_structure, self.labor_structure],
+            )
+
+    def restore(self, checkpoint, restore_rng=True):
+        """Return to the state of a Checkpoint, published as a new version.
+
+        The engine is rebuilt if the checkpoint was taken with a different structure.
+        Extra (non-structural) values are restored only for keys the simulator
+        already has. Raises ValueError, with nothing changed, if the checkpoint
+        does not fit its structure.
+        """
+        if restore_rng:
+            # Check the RNG state on a scratch generator, before anything is changed
+            try:
+                np.random.PCG64().state = checkpoint.rng_state
+            except (TypeError, ValueError, KeyError) as e:
+                raise ValueError(f"Invalid RNG state: {e}")
+        with self.lock:
+            machine_structure, labor_structure = checkpoint.structures
+            if machine_structure != self.machine_structure or labor_structure != self.labor_structure:
                 try:
-                    if current_type == bool:
-                        self.variables[key] = str(value).lower() in ['true', '1', 'yes']
-                    elif current_type == int:
-                        self.variables[key] = int(value)
-                    elif current_type == float:
-                        self.variables[key] = float(value)
-                    else:
-                        self.variables[key] = value # Fallback for other types
-                    
-                    # Apply constraints for specific variables
-                    if key == "generator1.value" or key == "generator2.value" or key == "generator3.value":
-                        self.variables[key] = max(0, min(10, self.variables[key]))
-                    if key == "producer.consumption":
-                         self.variables[key] = max(1, min(10, int(value))) # Assuming consumption is int
-
-                except ValueError:
-                    print(f"Error: Could not convert value '{value}' for key '{key}' to {current_type}")
-                    return False
-                
-                # Log the update with correct old and new values
-                print(f"Updating {key} from {old_value} to {self.variables[key]}")
-                return True
-            else:
-                print(f"Adding new variable {key} with value {value}")
-                self.variables[key] = value
-                return True
-            return False
+                    engine = StepEngine.from_structures([machine_structure, labor_structure], rng=self.rng)
+                except Exception as e:
+                    raise ValueError(f"Invalid checkpoint structure: {e}")
+                if len(checkpoint.state) != len(engine.keys):
+                    raise ValueError("Checkpoint does not match its structure")
+                self._replace_structures(machine_structure, labor_structure, engine=engine)
+            elif len(checkpoint.state) != len(self.engine.keys):
+                raise ValueError("Checkpoint does not match its structure")
+            self.engine.state[0] = checkpoint.state
+            # Unknown keys are never added, as with /api/update
+            extras = self.engine.extras[0]
+            restored = [key for key in checkpoint.extras if key in extras]
+            for key in restored:
+                extras[key] = checkpoint.extras[key]
+            self.cycle_count = checkpoint.cycle_count
+            if restore_rng:
+                self.rng.bit_generator.state = checkpoint.rng_state
+            self._record_changes(restored)
 
-    def update_components(self):
+    def fork(self, seed=None):
+        """Independent, stopped SimulatorBranch of the current state, e.g. for what-if runs.
+
+        Without a seed the branch continues the same random stream as this simulator.
+        """
+        rng = np.random.default_rng(seed)
         with self.lock:
-            # Chemical components
-            # Chemical 1
-            if not self.variables["chemical1.active"]:
-                # Slowly decrease fill level when inactive
-                if self.variables["chemical1.value"] > 0:
-                    self.variables["chemical1.value"] -= 0.2
-                    self.variables["chemical1.value"] = max(0, round(self.variables["chemical1.value"], 1))
-            else:
-                # Randomly fluctuate purity when active
-                purity_change = random.uniform(-0.5, 0.5)
-                self.variables["chemical1.purity"] += purity_change
-                self.variables["chemical1.purity"] = max(70, min(100, round(self.variables["chemical1.purity"], 1)))
-            
-            # Chemical 2
-            if not self.variables["chemical2.active"]:
-                # Slowly decrease fill level when inactive
-                if self.variables["chemical2.value"] > 0:
-                    self.variables["chemical2.value"] -= 0.2
-                    self.variables["chemical2.value"] = max(0, round(self.variables["chemical2.value"], 1))
-            else:
-                # Randomly fluctuate purity when active
-                purity_change = random.uniform(-0.5, 0.5)
-                self.variables["chemical2.purity"] += purity_change
-                self.variables["chemical2.purity"] = max(70, min(100, round(self.variables["chemical2.purity"], 1)))
-            
-            # Chemical 3
-            if not self.variables["chemical3.active"]:
-                # Slowly decrease fill level when inactive
-                if self.variables["chemical3.value"] > 0:
-                    self.variables["chemical3.value"] -= 0.2
-                    self.variables["chemical3.value"] = max(0, round(self.variables["chemical3.value"], 1))
-            else:
-                # Randomly fluctuate purity when active
-                purity_change = random.uniform(-0.5, 0.5)
-                self.variables["chemical3.purity"] += purity_change
-                self.variables["chemical3.purity"] = max(70, min(100, round(self.variables["chemical3.purity"], 1)))
-            
-            # Mixer
-            if self.variables["mixer.active"]:
-                # Calculate mixture quality based on chemical outputs and purities
-                # Only consider active chemicals
-                total_output = 0
-                weighted_purity = 0
-                
-                if self.variables["chemical1.active"] and self.variables["chemical1.value"] > 10:
-                    chem1_output = self.variables["chemical1.output"]
-                    total_output += chem1_output
-                    weighted_purity += chem1_output * self.variables["chemical1.purity"]
-                
-                if self.variables["chemical2.active"] and self.variables["chemical2.value"] > 10:
-                    chem2_output = self.variables["chemical2.output"]
-                    total_output += chem2_output
-                    weighted_purity += chem2_output * self.variables["chemical2.purity"]
-                
-                if self.variables["chemical3.active"] and self.variables["chemical3.value"] > 10:
-                    chem3_output = self.variables["chemical3.output"]
-                    total_output += chem3_output
-                    weighted_purity += chem3_output * self.variables["chemical3.purity"]
-                
-                # Calculate final mixture quality
-                if total_output > 0:
-                    # Base quality on weighted average of purities
-                    base_quality = weighted_purity / total_output
-                    
-                    # Penalty if total output exceeds max throughput
-                    max_throughput = self.variables["mixer.max_throughput"]
-                    throughput_penalty = max(0, (total_output - max_throughput) / 10)
-                    
-                    # Final quality with some randomness
-                    quality = base_quality - throughput_penalty + random.uniform(-2, 2)
-                    self.variables["mixer.mixture_quality"] = max(0, min(100, round(quality, 1)))
-                else:
-                    self.variables["mixer.mixture_quality"] = 0
-                
-                # Consume chemicals based on their output levels
-                if total_output > 0:
-                    consumption_rate = 0.1  # Base consumption rate per cycle
-                    
-                    if self.variables["chemical1.active"] and self.variables["chemical1.value"] > 0:
-                        consumption = (self.variables["chemical1.output"] / 100) * consumption_rate
-                        self.variables["chemical1.value"] -= consumption
-                        self.variables["chemical1.value"] = max(0, round(self.variables["chemical1.value"], 1))
-                    
-                    if self.variables["chemical2.active"] and self.variables["chemical2.value"] > 0:
-                        consumption = (self.variables["chemical2.output"] / 100) * consumption_rate
-                        self.variables["chemical2.value"] -= consumption
-                        self.variables["chemical2.value"] = max(0, round(self.variables["chemical2.value"], 1))
-                    
-                    if self.variables["chemical3.active"] and self.variables["chemical3.value"] > 0:
-                        consumption = (self.variables["chemical3.output"] / 100) * consumption_rate
-                        self.variables["chemical3.value"] -= consumption
-                        self.variables["chemical3.value"] = max(0, round(self.variables["chemical3.value"], 1))
-            else:
-                self.variables["mixer.mixture_quality"] = 0
-            
-            # Generator 1
-            if not self.variables["generator1.active"]:
-                self.variables["generator1.value"] = 0 # Keep it at user set value if active, otherwise 0
-            if not self.variables["generator1.active"] and self.variables["generator1.temp"] > 20:
-                self.variables["generator1.temp"] -= 0.1
-                self.variables["generator1.temp"] = round(self.variables["generator1.temp"], 2)
-            if self.variables["generator1.temp"] > 120:
-                self.variables["generator1.active"] = False
-            if self.variables["generator1.active"]:
-                temp_change = (self.variables["generator1.value"] - 3) / 20
-                self.variables["generator1.temp"] += temp_change
-                self.variables["generator1.temp"] = round(max(20, self.variables["generator1.temp"]), 2)
-
-            # Generator 2
-            if not self.variables["generator2.active"]:
-                self.variables["generator2.value"] = 0
-            if not self.variables["generator2.active"] and self.variables["generator2.temp"] > 20:
-                self.variables["generator2.temp"] -= 0.1
-                self.variables["generator2.temp"] = round(self.variables["generator2.temp"], 2)
-            if self.variables["generator2.active"]:
-                temp_change = (self.variables["generator2.value"] - 3) / 20
-                self.variables["generator2.temp"] += temp_change
-                self.variables["generator2.temp"] = round(max(20, self.variables["generator2.temp"]), 2)
-            if self.variables["generator2.temp"] > 120:
-                self.variables["generator2.active"] = False
-
-            # Generator 3
-            if not self.variables["generator3.active"]:
-                self.variables["generator3.value"] = 0
-            if not self.variables["generator3.active"] and self.variables["generator3.temp"] > 20:
-                self.variables["generator3.temp"] -= 0.1
-                self.variables["generator3.temp"] = round(self.variables["generator3.temp"], 2)
-            if self.variables["generator3.active"]:
-                temp_change = (self.variables["generator3.value"] - 3) / 20
-                self.variables["generator3.temp"] += temp_change
-                self.variables["generator3.temp"] = round(max(20, self.variables["generator3.temp"]), 2)
-            if self.variables["generator3.temp"] > 120:
-                self.variables["generator3.active"] = False
-
-            # Akkus
-            if self.variables["akku1.active"] and self.variables["akku1.value"] < self.variables["akku1.capacity"]:
-                self.variables["akku1.value"] += self.variables["generator1.value"]
-                if self.variables["akku1.value"] > self.variables["akku1.capacity"]:
-                    self.variables["akku1.value"] = self.variables["akku1.capacity"]
-            if self.variables["akku2.active"] and self.variables["akku2.value"] < self.variables["akku2.capacity"]:
-                self.variables["akku2.value"] += self.variables["generator2.value"]
-                if self.variables["akku2.value"] > self.variables["akku2.capacity"]:
-                    self.variables["akku2.value"] = self.variables["akku2.capacity"]
-            if self.variables["akku3.active"] and self.variables["akku3.value"] < self.variables["akku3.capacity"]:
-                self.variables["akku3.value"] += self.variables["generator3.value"]
-                if self.variables["akku3.value"] > self.variables["akku3.capacity"]:
-                    self.variables["akku3.value"] = self.variables["akku3.capacity"]
-            
-            # Aggregator
-            if self.variables["aggregator.active"]:
-                # Ensure akku values are positive before summing
-                akku1_val = self.variables["akku1.value"] if self.variables["akku1.active"] else 0
-                akku2_val = self.variables["akku2.value"] if self.variables["akku2.active"] else 0
-                akku3_val = self.variables["akku3.value"] if self.variables["akku3.active"] else 0
-                self.variables["aggregator.value"] = akku1_val + akku2_val + akku3_val
-            else: 
-                self.variables["aggregator.value"] = 0
-
-            # Producer
-            if self.variables["producer.active"] and self.variables["aggregator.active"] and self.variables["aggregator.value"] >= self.variables["producer.consumption"]:
-                consumed_amount = self.variables["producer.consumption"]
-                # self.variables["aggregator.value"] -= consumed_amount # This will be re-calculated from akkus
-                self.variables["producer.output"] = 1
-
-                active_akkus_with_charge = []
-                if self.variables["akku1.active"] and self.variables["akku1.value"] > 0:
-                    active_akkus_with_charge.append("akku1")
-                if self.variables["akku2.active"] and self.variables["akku2.value"] > 0:
-                    active_akkus_with_charge.append("akku2")
-                if self.variables["akku3.active"] and self.variables["akku3.value"] > 0:
-                    active_akkus_with_charge.append("akku3")
-                
-                if active_akkus_with_charge:
-                    chosen_akku_key_base = random.choice(active_akkus_with_charge)
-                    akku_value_key = f"{chosen_akku_key_base}.value"
-                    
-                    amount_to_drain = min(consumed_amount, self.variables[akku_value_key])
-                    self.variables[akku_value_key] -= amount_to_drain
-                    self.variables[akku_value_key] = max(0, self.variables[akku_value_key]) # Ensure not negative
-                
-                # Recalculate aggregator value after draining
-                akku1_val = self.variables["akku1.value"] if self.variables["akku1.active"] else 0
-                akku2_val = self.variables["akku2.value"] if self.variables["akku2.active"] else 0
-                akku3_val = self.variables["akku3.value"] if self.variables["akku3.active"] else 0
-                self.variables["aggregator.value"] = akku1_val + akku2_val + akku3_val
+            if seed is None:
+                rng.bit_generator.state = self.rng.bit_generator.state
+            return SimulatorBranch(self.engine.copy(rng=rng), self.cycle_count)
 
-            else:
-                self.variables["producer.output"] = 0
-            
-            # Product Counter
-            self.variables["productCounter.value"] += self.variables["producer.output"]
-
-            # Room Temperature Calculation
-            self.variables["room.temp"] = (self.variables["generator1.temp"] + 
-                                           self.variables["generator2.temp"] + 
-                                           self.variables["generator3.temp"]) / 3
-            self.variables["room.temp"] = round(self.variables["room.temp"], 2)
-
-            # Room Temperature Effect on Akkus
-            if self.variables["room.temp"] > 110:
-                self.variables["akku1.active"] = False
-                self.variables["akku2.active"] = False
-                self.variables["akku3.active"] = False
+    def enable_tick_log(self, directory):
+        """Record every tick to the columnar log in `directory`, written in the background."""
+        self.tick_log = TickLogWriter(directory, self.engine.keys, self.engine.kinds)
+        self.tick_log.start()
+
+    def run_headless(self, cycles, keys=None):
+        """Run `cycles` ticks back to back, without sleeping, and return their trajectory.
+
+        Returns a dict with a "cycle" array and one float64 array per requested key
+        (all structural variables by default; booleans as 0/1), holding the value
+        after every cycle. A single version is published at the end of the run.
+        """
+        engine = self.engine
+        keys = list(engine.keys if keys is None else keys)
+        columns = [engine.index[key] for key in keys]
+        trajectory = np.empty((cycles, len(columns)))
+        with self.lock:
+            first_cycle = self.cycle_count + 1
+            for cycle in range(cycles):
+                engine.step()
+                trajectory[cycle] = engine.state[0, columns]
+            self.cycle_count += cycles
+            self._record_changes()
+        result = {"cycle": np.arange(first_cycle, first_cycle + cycles)}
+        for i, key in enumerate(keys):
+            result[key] = trajectory[:, i]
+        return result
 
     def run_simulation_loop(self):
         self.running = True
         print("Machine simulation loop started.")
         try:
-            while self.running:
-                start_time = time.time()
-                self.update_components()
-                self.cycle_count += 1
-                if self.cycle_count % 4 == 0:
-                    # self.print_status() # Optionally print to console
-                    pass
-                
-                elapsed_time = time.time() - start_time
-                sleep_time = 0.3 - elapsed_time 
-                if sleep_time > 0:
-                    time.sleep(sleep_time)
+            self.scheduler.run(self.update_components)
         except Exception as e:
             print(f"Error in simulation loop: {e}")
         finally:
             print("Machine simulation loop stopped.")
-        
+
+    def run_replay_loop(self, log, speed=1.0, start=None, end=None):
+        """Feed the ticks of a TickLog back into the state, paced by their recorded times."""
+        self.running = True
+        print(f"Replaying {len(log)} logged ticks from {log.directory}.")
+        try:
+            first, last = log.row_range(start, end)
+            columns = [(self.engine.index[key], log.column(key)) for key in log.keys if key in self.engine.index]
+            cycles = log.column("cycle")
+            times = log.column("time")
+            for row in range(first, last):
+                if not self.running:
+                    break
+                with self.lock:
+                    self._apply_updates()
+                    for i, column in columns:
+                        self.engine.state[0, i] = column[row]
+                    self.cycle_count = int(cycles[row])
+                    self._record_changes()
+                if row + 1 < last:
+                    time.sleep(max(0.0, times[row + 1] - times[row]) / speed)
+        except Exception as e:
+            print(f"Error in replay loop: {e}")
+        finally:
+            print("Replay stopped.")
+
+    def start_replay(self, log, speed=1.0, start=None, end=None):
+        if not self.running:
+            self.simulation_thread = threading.Thread(
+                target=self.run_replay_loop, args=(log, speed, start, end), daemon=True
+            )
+            self.simulation_thread.start()
+
     def start_simulation(self):
         if not self.running:
             self.simulation_thread = threading.Thread(target=self.run_simulation_loop, daemon=True)
@@ -385,23 +562,118 @@ class MachineSimulator:
 
     def stop_simulation(self):
         self.running = False
+        self.scheduler.stop()
         if hasattr(self, 'simulation_thread') and self.simulation_thread.is_alive():
             self.simulation_thread.join(timeout=1) # Wait for thread to finish
+        if self.tick_log is not None:
+            self.tick_log.close()
         print("Machine simulator thread stopped.")
 
 # --- Flask App ---
 app = Flask(__name__)
 CORS(app) # Enable CORS for all routes
-simulator = MachineSimulator()
+simulator = MachineSimulator(tick_interval=float(os.environ.get('MACHINE_TICK_INTERVAL', 0.3)))
+# Optional fleet of independent machines for load tests, e.g. MACHINE_FLEET_SIZE=1000
+fleet = MachineFleet(
+    int(os.environ.get('MACHINE_FLEET_SIZE', 0)),
+    [simulator.machine_structure, simulator.labor_structure],
+    initial=INITIAL_VARIABLES,
+    tick_interval=float(os.environ.get('MACHINE_FLEET_INTERVAL', 0.3)),
+)
+# Largest fast-forward or fork a single request may ask for (about a month of ticks)
+MAX_FAST_FORWARD_CYCLES = 10_000_000
+# Checkpoints saved with POST /api/checkpoint?name=...
+checkpoints: Dict[str, Checkpoint] = {}
+
+# Per-endpoint request latency and response size, exported with the simulator's metrics
+request_seconds = simulator.metrics.histogram(
+    "machine_http_request_duration_seconds", "Time to handle an API request, by endpoint")
+response_bytes = simulator.metrics.histogram(
+    "machine_http_response_size_bytes", "Size of API response bodies, by endpoint",
+    lowest=16, highest=2 ** 24, per_octave=2)
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    labels = (("endpoint", request.url_rule.rule if request.url_rule else "unmatched"),
+              ("method", request.method))
+    request_seconds.observe(time.perf_counter() - g.get('request_start', time.perf_counter()), labels)
+    # Streams have no size until they end
+    if not response.is_streamed:
+        response_bytes.observe(response.content_length or 0, labels)
+    return response
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Runtime metrics in the Prometheus text format"""
+    return Response(simulator.metrics.render(), mimetype='text/plain; version=0.0.4')
 
 @app.route('/api/status', methods=['GET'])
 def get_status():
-    return jsonify(simulator.status_dict())
+    # Served from the published snapshot, without taking the simulator lock.
+    # With ?since=<version> only the variables changed after that version are sent;
+    # ?keys=, ?format=array and the Accept headers select fields and encodings (machine_encoding.py)
+    try:
+        encoded = encode_status(simulator.snapshot, request.args, request.headers.get('Accept', ''),
+                                request.headers.get('Accept-Encoding', ''))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if encoded.etag is None:
+        return Response(encoded.body, content_type=encoded.content_type, headers=encoded.headers())
+
+    if request.if_none_match.contains(encoded.etag):
+        response = Response(status=304)
+    else:
+        response = Response(encoded.body, content_type=encoded.content_type, headers=encoded.headers())
+    response.set_etag(encoded.etag)
+    # Let browsers cache the body but revalidate it on every poll
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/api/schema', methods=['GET'])
+def get_schema():
+    """Variable names in the order of /api/status?format=array, for the same ?keys="""
+    index = simulator.snapshot.index
+    keys = index.select(request.args['keys'])[0] if request.args.get('keys') else index.keys
+    return jsonify({"schema": index.schema, "keys": keys})
+
+@app.route('/api/stream', methods=['GET'])
+def stream_status():
+    """Server-Sent Events stream with one event of changed variables per new version"""
+    try:
+        since = int(request.args.get('since', request.headers.get('Last-Event-ID', 0)))
+    except ValueError:
+        return jsonify({"error": "since must be an integer version"}), 400
+
+    def events(since):
+        if since > simulator.version:
+            since = 0
+        while True:
+            simulator.wait_for_version(since, timeout=15)
+            version, changes = simulator.changes_since(since)
+            if version == since:
+                yield ": keepalive\n\n"
+                continue
+            yield f"id: {version}\ndata: {json.dumps({'epoch': simulator.epoch, 'version': version, 'changes': changes})}\n\n"
+            since = version
+
+    return Response(events(since), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
 
 @app.route('/api/structure', methods=['GET'])
 def get_structure():
     """Return the machine structure information for the frontend"""
-    return jsonify(simulator.machine_structure)
+    simulator.check_structures()
+    etag = simulator.structure_etag
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(simulator.structure_body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 @app.route('/api/update', methods=['POST'])
 def update_vars():
@@ -427,29 +699,175 @@ def update_vars():
             "variables": simulator.status_dict()
         }), 200
     
-    updated_keys = []
-    for key, value in data.items():
-        if simulator.update_variable(key, value):
-            updated_keys.append(key)
-            # Special handling for component values if they become inactive
-            if key.endswith(".active") and value is False:
-                if key.startswith("generator"):
-                    value_key = key.replace(".active", ".value")
-                    simulator.update_variable(value_key, 0)
-                elif key.startswith("chemical"):
-                    # Don't set chemical value to 0 immediately, let it decrease gradually
-                    pass
+    # All keys of the request are applied together at the next tick
+    batch, rejected = simulator.submit_updates(data)
+    if batch is None:
+        return jsonify({"error": "No valid variables found to update or values unchanged"}), 400
+    updated_keys = [key for key in data if key in batch.values]
+    if batch.version is None:
+        return jsonify({"message": "Variables queued", "updated_keys": updated_keys}), 202
+    return jsonify({
+        "message": "Variables updated",
+        "updated_keys": updated_keys,
+        "version": batch.version,
+        "new_values": simulator.snapshot.variables,
+    }), 200
 
+@app.route('/api/fast_forward', methods=['POST'])
+def fast_forward_simulator():
+    """Advance the simulator by {"cycles": N} ticks at once, leaping between events"""
+    data = request.get_json(silent=True) or {}
+    try:
+        cycles = int(data.get('cycles', 0))
+    except (TypeError, ValueError):
+        cycles = 0
+    if not 0 < cycles <= MAX_FAST_FORWARD_CYCLES:
+        return jsonify({"error": f"cycles must be between 1 and {MAX_FAST_FORWARD_CYCLES}"}), 400
+    report = fast_forward(simulator, cycles)
+    return jsonify(report), 200
 
+@app.route('/api/history', methods=['GET'])
+def get_history():
+    """Recorded history of ?keys=a,b since ?from=<unix time> at ?resolution=raw|10s|1m"""
+    keys = request.args.get('keys')
+    keys = keys.split(',') if keys else None
+    resolution = request.args.get('resolution', 'raw')
+    if resolution not in simulator.history.resolutions:
+        return jsonify({"error": f"resolution must be one of {', '.join(simulator.history.resolutions)}"}), 400
+    try:
+        start = float(request.args['from']) if 'from' in request.args else None
+        end = float(request.args['to']) if 'to' in request.args else None
+    except ValueError:
+        return jsonify({"error": "from and to must be unix timestamps"}), 400
+    try:
+        history = simulator.history.query(keys, start, end, resolution)
+    except KeyError as e:
+        return jsonify({"error": f"No history for {e.args[0]}"}), 404
+    return jsonify(history)
+
+@app.route('/api/scheduler', methods=['GET', 'POST'])
+def scheduler_settings():
+    """Target and achieved tick rate; POST {"interval": s, "periods": {"chemicals": 3}} to change them"""
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        # Everything is checked before anything changes, so a 400 leaves the schedule as it was
+        try:
+            interval = check_interval(data['interval']) if 'interval' in data else None
+            periods = simulator.scheduler.check_periods(data['periods']) if 'periods' in data else None
+        except (TypeError, ValueError, AttributeError) as e:
+            return jsonify({"error": str(e)}), 400
+        if interval is not None:
+            simulator.scheduler.set_interval(interval)
+        if periods is not None:
+            simulator.scheduler.set_periods(periods)
+    return jsonify(simulator.scheduler.stats())
+
+@app.route('/api/checkpoint', methods=['POST'])
+def create_checkpoint():
+    """Binary checkpoint of the simulator; with ?name=<name> it is kept in memory instead"""
+    checkpoint = simulator.checkpoint()
+    name = request.args.get('name')
+    if name:
+        checkpoints[name] = checkpoint
+        return jsonify({"message": "Checkpoint saved", "name": name, "cycle_count": checkpoint.cycle_count})
+    return Response(checkpoint.to_bytes(), mimetype='application/octet-stream')
+
+@app.route('/api/restore', methods=['POST'])
+def restore_checkpoint():
+    """Restore a binary checkpoint posted as the body, or the one saved as ?name=<name>"""
+    name = request.args.get('name')
+    if name:
+        checkpoint = checkpoints.get(name)
+        if checkpoint is None:
+            return jsonify({"error": f"Unknown checkpoint {name}"}), 404
+    else:
+        try:
+            checkpoint = Checkpoint.from_bytes(request.get_data())
+        except (ValueError, KeyError) as e:
+            return jsonify({"error": f"Invalid checkpoint: {e}"}), 400
+    try:
+        simulator.restore(checkpoint)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"message": "Checkpoint restored", "version": simulator.version, "cycle_count": simulator.cycle_count})
+
+@app.route('/api/fork', methods=['POST'])
+def fork_simulator():
+    """What-if run: fork the current state, apply {"overrides": {...}} and fast-forward {"cycles": N}"""
+    data = request.get_json(silent=True) or {}
+    try:
+        cycles = int(data.get('cycles', 0))
+    except (TypeError, ValueError):
+        cycles = 0
+    if not 0 < cycles <= MAX_FAST_FORWARD_CYCLES:
+        return jsonify({"error": f"cycles must be between 1 and {MAX_FAST_FORWARD_CYCLES}"}), 400
+    seed = data.get('seed')
+    if seed is not None and (not isinstance(seed, int) or isinstance(seed, bool) or seed < 0):
+        return jsonify({"error": "seed must be a non-negative integer"}), 400
+    branch = simulator.fork(seed=seed)
+    values, rejected = branch.prepare_updates(data.get('overrides') or {})
+    if rejected:
+        return jsonify({"error": f"Invalid values for {', '.join(rejected)}"}), 400
+    for key, value in values.items():
+        branch.variables[key] = value
+    fast_forward(branch, cycles)
+    return jsonify({"cycle_count": branch.cycle_count, "variables": branch.status_dict()})
+
+@app.route('/api/machines', methods=['GET'])
+def get_fleet():
+    """Return fleet size and the sustained tick rate it achieves"""
+    return jsonify(fleet.stats())
+
+@app.route('/api/machines/<machine_id>/status', methods=['GET'])
+def get_machine_status(machine_id):
+    if machine_id not in fleet:
+        return jsonify({"error": f"Unknown machine {machine_id}"}), 404
+    return jsonify(fleet.status_dict(machine_id))
+
+@app.route('/api/machines/<machine_id>/update', methods=['POST'])
+def update_machine_vars(machine_id):
+    if machine_id not in fleet:
+        return jsonify({"error": f"Unknown machine {machine_id}"}), 404
+    data = request.get_json()
+    if not data:
+        return jsonify({"error": "Invalid JSON"}), 400
+
+    updated_keys = fleet.update_variables(machine_id, data)
     if updated_keys:
-        return jsonify({"message": "Variables updated", "updated_keys": updated_keys, "new_values": simulator.status_dict()}), 200
+        return jsonify({"message": "Variables updated", "updated_keys": updated_keys, "new_values": fleet.status_dict(machine_id)}), 200
     else:
         return jsonify({"error": "No valid variables found to update or values unchanged"}), 400
 
 if __name__ == "__main__":
-    simulator.start_simulation()
-    print("Starting Flask server for Machine Simulator API...")
-    app.run(host='0.0.0.0', port=5000) # Runs on port 5000
+    # MACHINE_API_WORKERS=<n> serves the API from n processes reading shared memory (machine_shm.py);
+    # they are forked before any thread starts
+    workers = int(os.environ.get('MACHINE_API_WORKERS', 0))
+    if workers:
+        worker_processes = start_workers(simulator, app, workers, host='0.0.0.0', port=5000)
+    # MACHINE_REPLAY=<dir> serves a recorded tick log instead of simulating,
+    # MACHINE_TICK_LOG=<dir> records the live simulation
+    if os.environ.get('MACHINE_REPLAY'):
+        simulator.start_replay(TickLog(os.environ['MACHINE_REPLAY']),
+                               speed=float(os.environ.get('MACHINE_REPLAY_SPEED', 1.0)))
+    else:
+        if os.environ.get('MACHINE_TICK_LOG'):
+            simulator.enable_tick_log(os.environ['MACHINE_TICK_LOG'])
+        simulator.start_simulation()
+    fleet.start_simulation()
+    if workers:
+        # Stop cleanly on SIGTERM too, so the shared memory segment is removed
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        try:
+            for process in worker_processes:
+                process.join()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            simulator.stop_simulation()
+            simulator.shared_state.unlink()
+    else:
+        print("Starting Flask server for Machine Simulator API...")
+        app.run(host='0.0.0.0', port=5000) # Runs on port 5000
     # When Flask server stops (e.g., Ctrl+C), stop the simulation
     # This might not be reached if app.run() blocks indefinitely without debug=True
     # Consider a more robust shutdown mechanism if needed
@@ -0,0 +1,51 @@
+import json
+import numpy as np
+
+
+def encode_json(data):
+    """Compact JSON bytes with sorted keys, the same shape jsonify produces."""
+    return json.dumps(data, sort_keys=True, separators=(',', ':')).encode() + b'\n'
+
+
+class StatusSnapshot:
+    """Immutable copy of the machine state as published after a tick or update.
+
+    The simulator swaps in a new snapshot under its lock; readers only load the
+    `snapshot` attribute, which is atomic, and never touch the lock. The JSON body
+    and its ETag are encoded once per version and shared by every reader; other
+    encodings of it are kept in `encoded` (see machine_encoding.py).
+    """
+
+    __slots__ = ("epoch", "version", "cycle_count", "variables", "body", "etag", "index", "encoded",
+                 "_keys", "_changed_at", "_extra_changed_at")
+
+    def __init__(self, epoch, version, cycle_count, variables, keys, changed_at, extra_changed_at, index=None):
+        # Random per process; clients holding versions of another epoch must start over
+        self.epoch = epoch
+        self.version = version
+        self.cycle_count = cycle_count
+        self.variables = variables
+        self.body = encode_json(variables)
+        # Versions restart with the process, so the epoch also keeps ETags unique
+        self.etag = f"{epoch}-{version}"
+        # KeyIndex over the names in `variables`, for ?keys= selectors
+        self.index = index
+        self.encoded = {}
+        self._keys = keys
+        self._changed_at = changed_at
+        self._extra_changed_at = extra_changed_at
+
+    def changes_since(self, since):
+        """Return (version, changes) with the variables changed after version `since`.
+
+        A `since` newer than this snapshot (e.g. from before a restart) gets the full state.
+        """
+        if since > self.version:
+            since = 0
+        variables = self.variables
+        keys = self._keys
+        changes = {keys[i]: variables[keys[i]] for i in np.flatnonzero(self._changed_at > since).tolist()}
+        for key, changed_at in self._extra_changed_at.items():
+            if changed_at > since:
+                changes[key] = variables[key]
+        return self.version, changes
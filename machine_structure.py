@@ -0,0 +1,43 @@
+import json
+import os
+
+
+class StructureFile:
+    """A structure JSON file next to this module, reloaded when its modification time changes.
+
+    If the file cannot be read or parsed, the previous structure (or `fallback`,
+    on the first load) stays in use until the file changes again.
+    """
+
+    def __init__(self, filename, fallback):
+        self.path = os.path.join(os.path.dirname(__file__), filename)
+        self.structure = fallback
+        self.mtime = None
+        self.reload()
+
+    def _stat(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def changed(self):
+        return self._stat() != self.mtime
+
+    def reload(self):
+        """Load the file if it changed since the last load; returns True if the structure changed."""
+        mtime = self._stat()
+        if mtime == self.mtime:
+            return False
+        self.mtime = mtime
+        try:
+            with open(self.path, 'r') as f:
+                structure = json.load(f)
+        except Exception as e:
+            print(f"Error loading machine structure from {self.path}: {e}")
+            return False
+        print(f"Successfully loaded machine structure from {self.path}")
+        if structure == self.structure:
+            return False
+        self.structure = structure
+        return True
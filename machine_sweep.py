@@ -0,0 +1,164 @@
+"""Parameter sweeps and Monte Carlo runs of the machine simulator over a process pool.
+
+Every scenario is a dict of initial variable overrides, run headless for a
+number of cycles with its own seed. Examples:
+
+    python machine_sweep.py --grid generator1.value=3,6,9 --grid producer.consumption=2,5,8 \\
+        --cycles 12000 --seed 1 --output sweep.csv
+    python machine_sweep.py --random chemical1.output=0:100 --random mixer.max_throughput=100:300 \\
+        --samples 200 --cycles 3000 --workers 8
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from machine_batch import apply_overrides, _parse_overrides
+
+TICK_SECONDS = 0.3
+
+
+def grid(values):
+    """All combinations of {key: [values]} as a list of override dicts."""
+    keys = list(values)
+    return [dict(zip(keys, combination)) for combination in itertools.product(*(values[key] for key in keys))]
+
+
+def random_sample(ranges, samples, seed=None):
+    """`samples` override dicts drawn from {key: (low, high)} uniformly, or {key: [choices]}."""
+    rng = np.random.default_rng(seed)
+    scenarios = []
+    for _ in range(samples):
+        scenario = {}
+        for key, choices in ranges.items():
+            if isinstance(choices, tuple):
+                scenario[key] = float(rng.uniform(*choices))
+            else:
+                scenario[key] = choices[rng.integers(len(choices))]
+        scenarios.append(scenario)
+    return scenarios
+
+
+def run_scenario(overrides, cycles, seed):
+    """Run one scenario headless and return its summary metrics."""
+    from machine_simulator import MachineSimulator
+    simulator = MachineSimulator(seed=seed)
+    apply_overrides(simulator, overrides)
+    groups = simulator.engine.groups
+    counters = [f"{unit_id}.value" for unit_id in groups["counter"].ids]
+    generators = [f"{unit_id}.active" for unit_id in groups["generator"].ids]
+    mixers = [f"{unit_id}.mixture_quality" for unit_id in groups["mixer"].ids]
+    akkus = groups["battery"].ids
+    akku_keys = [f"{unit_id}.{field}" for unit_id in akkus for field in ("value", "capacity")]
+
+    initial_count = sum(simulator.variables[key] for key in counters)
+    initial_active = np.array([simulator.variables[key] for key in generators], dtype=np.float64)
+    trajectory = simulator.run_headless(cycles, counters + generators + mixers + akku_keys)
+
+    # Generators only switch off on their own when they overheat
+    first_trip = None
+    if generators:
+        active = np.vstack([initial_active, np.column_stack([trajectory[key] for key in generators])])
+        tripped = np.flatnonzero(((active[:-1] > 0.5) & (active[1:] < 0.5)).any(axis=1))
+        if len(tripped):
+            first_trip = int(tripped[0]) + 1
+
+    utilisation = [
+        np.mean(trajectory[f"{unit_id}.value"] / np.maximum(trajectory[f"{unit_id}.capacity"], 1))
+        for unit_id in akkus
+    ]
+    return {
+        "overrides": overrides,
+        "seed": seed,
+        "cycles": cycles,
+        "products": int(sum(trajectory[key][-1] for key in counters) - initial_count),
+        "first_trip_cycle": first_trip,
+        "first_trip_seconds": None if first_trip is None else first_trip * TICK_SECONDS,
+        "mean_mixture_quality": float(np.mean([trajectory[key].mean() for key in mixers])) if mixers else 0.0,
+        "akku_utilisation": float(np.mean(utilisation)) if utilisation else 0.0,
+    }
+
+
+def _run_packed(args):
+    return run_scenario(*args)
+
+
+def run_sweep(scenarios, cycles, seed=None, workers=None, repeats=1):
+    """Run every scenario `repeats` times across a process pool; returns one result per run.
+
+    Each run gets an independent seed spawned from `seed`, so a sweep is
+    reproducible while no two runs share a random stream.
+    """
+    runs = [overrides for overrides in scenarios for _ in range(repeats)]
+    seeds = [int(child.generate_state(1)[0]) for child in np.random.SeedSequence(seed).spawn(len(runs))]
+    tasks = [(overrides, cycles, run_seed) for overrides, run_seed in zip(runs, seeds)]
+    workers = workers or os.cpu_count()
+    if workers == 1:
+        return [_run_packed(task) for task in tasks]
+    # A few tasks per chunk keeps the pool busy without one worker getting the tail
+    chunksize = max(1, len(tasks) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(_run_packed, tasks, chunksize=chunksize))
+
+
+def _parse_values(assignments, parse):
+    values = {}
+    for key, spec in _parse_overrides(assignments).items():
+        values[key] = parse(spec)
+    return values
+
+
+def _parse_range(spec):
+    if ":" in spec:
+        low, high = spec.split(":")
+        return (float(low), float(high))
+    return spec.split(",")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run many headless simulator scenarios in parallel")
+    parser.add_argument("--grid", action="append", default=[], metavar="KEY=V1,V2,...",
+                        help="values of one variable to combine with all other --grid variables")
+    parser.add_argument("--random", action="append", default=[], metavar="KEY=LOW:HIGH|V1,V2,...",
+                        help="range or choices of one variable for random sampling")
+    parser.add_argument("--samples", type=int, default=100, help="number of random scenarios")
+    parser.add_argument("--repeats", type=int, default=1, help="runs per scenario, each with its own seed")
+    parser.add_argument("--cycles", type=int, default=12000, help="ticks per run (12000 = 1 h at 0.3 s)")
+    parser.add_argument("--seed", type=int, default=None, help="seed of the whole sweep")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--output", default=None, help="write the results to a .csv or .json file")
+    args = parser.parse_args()
+
+    if args.random:
+        scenarios = random_sample(_parse_values(args.random, _parse_range), args.samples, args.seed)
+    else:
+        scenarios = grid(_parse_values(args.grid, lambda spec: spec.split(",")))
+
+    start_time = time.perf_counter()
+    results = run_sweep(scenarios, args.cycles, args.seed, args.workers, args.repeats)
+    elapsed_time = time.perf_counter() - start_time
+    print(f"Ran {len(results)} scenarios of {args.cycles} cycles in {elapsed_time:.2f} s")
+
+    for result in sorted(results, key=lambda result: -result["products"])[:10]:
+        print(f"products {result['products']:6d}  trip {str(result['first_trip_cycle']):>6s}  "
+              f"quality {result['mean_mixture_quality']:6.2f}  akkus {result['akku_utilisation']:.3f}  "
+              f"{result['overrides']}")
+
+    if args.output and args.output.endswith(".csv"):
+        keys = sorted({key for result in results for key in result["overrides"]})
+        with open(args.output, "w", newline="") as f:
+            writer = csv.writer(f)
+            columns = ["seed", "products", "first_trip_cycle", "mean_mixture_quality", "akku_utilisation"]
+            writer.writerow(keys + columns)
+            for result in results:
+                writer.writerow([result["overrides"].get(key) for key in keys] + [result[column] for column in columns])
+    elif args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
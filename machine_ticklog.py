@@ -0,0 +1,168 @@
+"""Append-only, memory-mapped columnar log of every simulation tick.
+
+A log is a directory with one raw little-endian file per column: `cycle.col`,
+`time.col` and `<key>.col` for every structural variable, plus `meta.json`
+(keys and column types) and `rows.col` (the number of complete rows). Columns
+are fixed width, so row i of every column is at a known offset and reads are
+plain memory-mapped slices.
+"""
+import json
+import os
+import threading
+import numpy as np
+from collections import deque
+
+COLUMN_DTYPES = {"bool": "<u1", "int": "<i8", "float": "<f8"}
+GROW_ROWS = 65536 # Columns are extended in chunks of this many rows (about 5.5 h at 0.3 s)
+
+
+def _column_path(directory, name):
+    return os.path.join(directory, f"{name}.col")
+
+
+def _read_meta(directory):
+    with open(os.path.join(directory, "meta.json")) as f:
+        return json.load(f)
+
+
+class TickLogWriter:
+    """Appends ticks to a log from a background thread.
+
+    `append` only copies the row into a queue, so the simulation tick never waits
+    for the disk. Appending to an existing log requires the same keys.
+    """
+
+    def __init__(self, directory, keys, kinds, flush_interval=0.5):
+        self.directory = directory
+        self.keys = list(keys)
+        self.dtypes = {"cycle": "<i8", "time": "<f8"}
+        for key, kind in zip(self.keys, kinds):
+            self.dtypes[key] = COLUMN_DTYPES[kind.__name__]
+        self.flush_interval = flush_interval
+        self._pending = deque()
+        self._wakeup = threading.Event()
+        self.running = False
+
+        os.makedirs(directory, exist_ok=True)
+        meta_path = os.path.join(directory, "meta.json")
+        if os.path.exists(meta_path):
+            meta = _read_meta(directory)
+            if meta["keys"] != self.keys:
+                raise ValueError(f"Tick log {directory} was written with different variables")
+        else:
+            with open(meta_path, "w") as f:
+                json.dump({"keys": self.keys, "dtypes": self.dtypes}, f)
+
+        rows_path = _column_path(directory, "rows")
+        if not os.path.exists(rows_path):
+            np.zeros(1, dtype="<i8").tofile(rows_path)
+        self._rows = np.memmap(rows_path, dtype="<i8", mode="r+", shape=(1,))
+        self._capacity = 0
+        self._grow(int(self._rows[0]) + GROW_ROWS)
+
+    def __len__(self):
+        return int(self._rows[0])
+
+    def _grow(self, capacity):
+        self._columns = {}
+        for name, dtype in self.dtypes.items():
+            path = _column_path(self.directory, name)
+            with open(path, "ab") as f:
+                f.truncate(capacity * np.dtype(dtype).itemsize)
+            self._columns[name] = np.memmap(path, dtype=dtype, mode="r+", shape=(capacity,))
+        self._capacity = capacity
+
+    def append(self, cycle, timestamp, row):
+        # Called from the tick; never touches the disk
+        self._pending.append((cycle, timestamp, row.copy()))
+
+    def flush(self):
+        """Write all queued ticks to the columns."""
+        if not self._pending:
+            return
+        batch = []
+        while self._pending:
+            batch.append(self._pending.popleft())
+        start = len(self)
+        end = start + len(batch)
+        if end > self._capacity:
+            self._grow(end + GROW_ROWS)
+        cycles, timestamps, rows = zip(*batch)
+        values = np.vstack(rows)
+        self._columns["cycle"][start:end] = cycles
+        self._columns["time"][start:end] = timestamps
+        for i, key in enumerate(self.keys):
+            self._columns[key][start:end] = values[:, i]
+        # Rows are published only after their data, so readers never see a partial row
+        self._rows[0] = end
+
+    def run_writer_loop(self):
+        self.running = True
+        try:
+            while self.running:
+                self._wakeup.wait(self.flush_interval)
+                self._wakeup.clear()
+                self.flush()
+        except Exception as e:
+            print(f"Error in tick log writer: {e}")
+        finally:
+            self.flush()
+
+    def start(self):
+        if not self.running:
+            self.writer_thread = threading.Thread(target=self.run_writer_loop, daemon=True)
+            self.writer_thread.start()
+            print(f"Tick log writer started in {self.directory}.")
+
+    def close(self):
+        self.running = False
+        self._wakeup.set()
+        if hasattr(self, 'writer_thread') and self.writer_thread.is_alive():
+            self.writer_thread.join(timeout=5)
+        else:
+            self.flush()
+
+
+class TickLog:
+    """Read-only view of a tick log; columns are zero-copy memory-mapped arrays."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        meta = _read_meta(directory)
+        self.keys = meta["keys"]
+        self.dtypes = meta["dtypes"]
+        self._rows = np.memmap(_column_path(directory, "rows"), dtype="<i8", mode="r", shape=(1,))
+        self.refresh()
+
+    def refresh(self):
+        """Pick up rows appended since the log was opened."""
+        self.rows = int(self._rows[0])
+        self._columns = {}
+        if self.rows:
+            for name, dtype in self.dtypes.items():
+                self._columns[name] = np.memmap(_column_path(self.directory, name), dtype=dtype,
+                                                mode="r", shape=(self.rows,))
+
+    def __len__(self):
+        return self.rows
+
+    def column(self, name):
+        """The whole column `name` ("cycle", "time" or a variable), without copying."""
+        if name not in self.dtypes:
+            raise KeyError(name)
+        if not self.rows:
+            return np.empty(0, dtype=self.dtypes[name])
+        return self._columns[name]
+
+    def row_range(self, start=None, end=None):
+        """Rows [first, last) with start <= time <= end, found by binary search."""
+        times = self.column("time")
+        first = 0 if start is None else int(np.searchsorted(times, start, side="left"))
+        last = self.rows if end is None else int(np.searchsorted(times, end, side="right"))
+        return first, last
+
+    def read(self, keys=None, start=None, end=None):
+        """Columns of `keys` (plus cycle and time) between unix times `start` and `end`, as views."""
+        first, last = self.row_range(start, end)
+        names = ["cycle", "time"] + list(self.keys if keys is None else keys)
+        return {name: self.column(name)[first:last] for name in names}